@@ -0,0 +1,169 @@
+"""Benchmarks for LIDAR filters from lidarfilters.py
+
+Times RangeFilter.update and TemporalFilter.update over a sweep of scan lengths (N),
+values of D, input types (list or np.ndarray) and dtypes, using seeded random scans
+so runs can be compared. Results can be saved as JSON and checked against
+the results of an earlier run:
+
+    python filterbenchmarks.py --output baseline.json
+    python filterbenchmarks.py --baseline baseline.json --threshold 0.25
+
+The second command exits with status 1 if any case got slower by more than 25%.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+import lidarfilters as filters
+
+
+def make_scans(rng, count, length, dtype):
+    """Returns count random scans of the given length as a (count, length) array.
+    Most values lie between 0 and 60 with some outside of the default range of RangeFilter.
+    Integer scans are in millimeters, so their values lie between 0 and 60000."""
+    scans = rng.uniform(-5, 60, size=(count, length))
+    if np.dtype(dtype).kind in "iu":
+        scans = np.clip(scans * 1000, 0, None)
+    return scans.astype(dtype)
+
+
+def time_calls(call, scans, min_runs, max_seconds):
+    """Calls call with the scans in turn (starting over when they run out) until it has been
+    called at least min_runs times and max_seconds have passed, and returns the time of every call."""
+    times = []
+    started = time.perf_counter()
+    while len(times) < min_runs or time.perf_counter() - started < max_seconds:
+        scan = scans[len(times) % len(scans)]
+        start = time.perf_counter()
+        call(scan)
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+def run_case(name, length, D, input_type, dtype, args):
+    """Times one case and returns its result as a dict."""
+    # Every case gets its own seed so its scans don't depend on which other cases run.
+    rng = np.random.default_rng([args.seed, length, D])
+    scans = make_scans(rng, args.pool, length, dtype)
+    if input_type == "list":
+        scans = [scan.tolist() for scan in scans]
+
+    if name == "RangeFilter.update":
+        # Integer scans are in millimeters.
+        call = filters.RangeFilter(scale=1000 if np.dtype(dtype).kind in "iu" else 1, backend=args.backend).update
+    else:
+        # Fill the window first so every timed update takes the median of D+1 scans.
+        temporal_filter = filters.TemporalFilter(D, backend=args.backend)
+        for t in range(D + 1):
+            temporal_filter.update(scans[t % len(scans)])
+        call = temporal_filter.update
+
+    times = time_calls(call, scans, args.min_runs, args.max_seconds)
+    return {
+        "name": name,
+        "N": length,
+        "D": D,
+        "input": input_type,
+        "dtype": np.dtype(dtype).name,
+        "runs": len(times),
+        "p50": float(np.percentile(times, 50)),
+        "p90": float(np.percentile(times, 90)),
+        "p99": float(np.percentile(times, 99)),
+        "mean": float(times.mean()),
+        "scans_per_second": float(1 / times.mean()),
+    }
+
+
+def case_key(result):
+    """Returns what identifies a case when comparing with a baseline."""
+    return (result["name"], result["N"], result["D"], result["input"], result["dtype"])
+
+
+def compare(results, baseline, threshold):
+    """Prints how every case compares with the baseline and returns the cases
+    whose median time went up by more than threshold (a fraction)."""
+    old_results = {case_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = old_results.get(case_key(result))
+        if old is None:
+            continue
+        change = result["p50"] / old["p50"] - 1
+        print("{:<22} N={:<8} D={:<4} {:<7} {:<8} {:+7.1%}".format(*case_key(result), change))
+        if change > threshold:
+            regressions.append(result)
+    return regressions
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[360, 2000, 100000, 1000000],
+                        help="scan lengths N to sweep")
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 5, 20, 200],
+                        help="values of D to sweep for TemporalFilter")
+    parser.add_argument("--inputs", nargs="+", default=["list", "ndarray"], choices=["list", "ndarray"],
+                        help="input types to sweep")
+    parser.add_argument("--dtypes", nargs="+", default=["float64", "float32"],
+                        help="dtypes to sweep (integer dtypes such as uint16 are scans in millimeters)")
+    parser.add_argument("--filters", nargs="+", default=["RangeFilter.update", "TemporalFilter.update"],
+                        choices=["RangeFilter.update", "TemporalFilter.update"], help="methods to time")
+    parser.add_argument("--backend", default="auto", choices=["auto"] + list(filters._BACKENDS),
+                        help="backend of the filters (default auto)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random scans")
+    parser.add_argument("--pool", type=int, default=8, help="number of different scans per case")
+    parser.add_argument("--min-runs", type=int, default=5, help="least number of timed calls per case")
+    parser.add_argument("--max-seconds", type=float, default=1.0, help="time spent on a case once min-runs is reached")
+    parser.add_argument("--max-history", type=float, default=2e7,
+                        help="skip TemporalFilter cases whose (D+1)*N is larger than this")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="largest allowed increase of the median time over the baseline (default 0.2)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+
+    results = []
+    for name in args.filters:
+        depths = args.depths if name == "TemporalFilter.update" else [0]
+        for length in args.lengths:
+            for D in depths:
+                if name == "TemporalFilter.update" and (D + 1) * length > args.max_history:
+                    continue
+                for input_type in args.inputs:
+                    for dtype in args.dtypes:
+                        result = run_case(name, length, D, input_type, dtype, args)
+                        results.append(result)
+                        print("{:<22} N={:<8} D={:<4} {:<7} {:<8} p50={:.3e}s p99={:.3e}s {:.1f} scans/s".format(
+                            *case_key(result), result["p50"], result["p99"], result["scans_per_second"]))
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "backend": args.backend,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("{} case(s) got more than {:.0%} slower than the baseline".format(len(regressions), args.threshold))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,41 +1,38 @@
 """Tests for LIDAR filters from lidarfilters.py"""
 
+import asyncio
+import importlib.util
+import os
+import tempfile
+import warnings
+
 import lidarfilters as filters
+import lidarstream
 import numpy as np
-import time
 
-#time delay for Temporal Filter Tests
-default_delay = 2
+# Seeded so every run tests the same scans.
+# filterbenchmarks.py times the filters.
+rng = np.random.default_rng(2019)
 
 
 """Functions to help us test the filter objects"""
 
-def get_a_really_random_number():
-    x = np.random.randint(100)
-    y = np.random.uniform(-x,x)
-
-    if y == 0:
-        x = np.random.randint(100)
-        y = np.random.uniform(-x, x)
-
-    z = 0.25 * y * np.random.uniform(-x,x)
+def get_really_random_numbers(count):
+    x = rng.integers(1, 100, size=count)
+    y = rng.uniform(-x, x)
+    z = 0.25 * y * rng.uniform(-x, x)
     return z
 
 
 def make_long_scan():
-    long_scan = []
-    for i in range(2000):
-        long_scan.append(get_a_really_random_number())
+    long_scan = get_really_random_numbers(2000).tolist()
 
     return long_scan
 
 
 def make_random_length_scan():
-    random_length = int(abs(get_a_really_random_number()))
-    random_length_scan = []
-
-    for i in range(random_length):
-        random_length_scan.append(get_a_really_random_number())
+    random_length = int(abs(get_really_random_numbers(1)[0]))
+    random_length_scan = get_really_random_numbers(random_length).tolist()
 
     return random_length_scan
 
@@ -46,6 +43,11 @@ def make_empty_scan():
     return empty_scan
 
 
+def check_range(filtered_scans, low, high):
+    for filtered_scan in filtered_scans.values():
+        assert all(low <= measurement <= high for measurement in filtered_scan)
+
+
 """Range Filter Tests"""
 
 range_filter1 = filters.RangeFilter()
@@ -62,6 +64,7 @@ range_filter1_dict = {
 # where 0.03 <= each number in list <= 50 .
 # Except on make_empty_scan()
 # print(range_filter1_dict[1]) # 1 can be replaced with 2 or 3
+check_range(range_filter1_dict, 0.03, 50)
 
 
 range_filter2_dict = {
@@ -73,6 +76,7 @@ range_filter2_dict = {
 # where 1.77 <= each number in list <= 50 .
 # Except on make_empty_scan() .
 # print(range_filter2_dict[1]) # 1 can be replaced with 2 or 3
+check_range(range_filter2_dict, 1.77, 50)
 
 
 range_filter3_dict = {
@@ -84,6 +88,7 @@ range_filter3_dict = {
 # where 2 <= each number in list <= 4 .
 # Except on make_empty_scan() .
 # print(range_filter3_dict[1]) # 1 can be replaced with 2 or 3
+check_range(range_filter3_dict, 2, 4)
 
 
 range_filter4_dict = {
@@ -95,11 +100,12 @@ range_filter4_dict = {
 # where -2 <= each number in list <= 3 .
 # Except on make_empty_scan() .
 # print(range_filter4_dict[1])  # 1 can be replaced with 2 or 3
+check_range(range_filter4_dict, -2, 3)
 
 
 """Temporal Filter Tests"""
 
-D = np.random.randint(15) + 0.1234  # The TemporalFilter object will work even if it gets a float as an arg
+D = rng.integers(15) + 0.1234  # The TemporalFilter object will work even if it gets a float as an arg
 print(" D is {}".format(D))
 
 temporal_filter = filters.TemporalFilter(D)
@@ -108,15 +114,417 @@ temporal_filter = filters.TemporalFilter(D)
 for i in range(30):
     scan = make_long_scan()
     print("Number at index 999 of current scan is {} ".format(scan[999]))
-    time.sleep(default_delay)
     temporal_filter.update(scan)
     print("Current median at index 999 of _current_y_list "
           "is {} ".format(temporal_filter._current_y_list[999]))
-    time.sleep(default_delay)
-
-
-
-
-
 
 
+"""Backend Tests"""
+
+# Every backend must return exactly the same scans and medians.
+# The "jit" backend is only tested when numba is installed, and then it must be.
+numba_installed = importlib.util.find_spec("numba") is not None
+assert filters._load_jit() == numba_installed
+backends = [backend for backend in filters._BACKENDS if backend != "jit" or numba_installed]
+print("Testing backends {}".format(backends))
+
+
+def make_backend_scans(dtype):
+    scans = get_really_random_numbers(20 * 200).reshape(20, 200)
+    if np.dtype(dtype).kind == "i":
+        # Samples of both signs near the ends of the dtype, whose means overflow it easily.
+        scans = np.clip(scans * np.iinfo(dtype).max / 4, np.iinfo(dtype).min, np.iinfo(dtype).max)
+        scans[rng.random(scans.shape) < 0.1] = 0  # dropouts
+    elif np.dtype(dtype).kind == "u":
+        scans = np.clip(scans, 0, None) * 100
+        scans[rng.random(scans.shape) < 0.1] = 0  # dropouts
+    else:
+        scans[rng.random(scans.shape) < 0.05] = np.nan
+        scans[rng.random(scans.shape) < 0.05] = np.inf
+    return scans.astype(dtype)
+
+
+def check_backends(make_filter, scans):
+    outputs = []
+    for backend in backends:
+        filter_object = make_filter(backend)
+        outputs.append(np.array([filter_object.update_array(scan) for scan in scans]))
+    for output in outputs[1:]:
+        assert output.dtype == outputs[0].dtype
+        assert np.array_equal(output, outputs[0], equal_nan=True)
+
+
+for dtype in ["float64", "float32", "uint16", "int16"]:
+    backend_scans = make_backend_scans(dtype)
+    dropout = 0 if np.dtype(dtype).kind in "iu" else None
+    check_backends(lambda backend: filters.RangeFilter(2, 40, backend=backend), backend_scans)
+    check_backends(lambda backend: filters.RangeFilter(2, 40, dropout=dropout, backend=backend), backend_scans)
+    for backend_D in [0, 3, 6]:
+        check_backends(lambda backend: filters.TemporalFilter(backend_D, backend=backend), backend_scans)
+        check_backends(lambda backend: filters.TemporalFilter(backend_D, nonfinite="missing", dropout=dropout,
+                                                              backend=backend), backend_scans)
+    check_backends(lambda backend: filters.SpatioTemporalFilter(2, radius=2, wrap=False, backend=backend),
+                   backend_scans)
+    check_backends(lambda backend: filters.SpatioTemporalFilter(2, nonfinite="missing", dropout=dropout,
+                                                                backend=backend), backend_scans)
+
+# Empty scans give empty medians, like they always have.
+for backend in backends:
+    assert filters.TemporalFilter(2, backend=backend).update([]) == []
+    assert filters.TemporalFilter(2, nonfinite="missing", backend=backend).update_array(np.empty(0)).shape == (0,)
+    assert filters.RangeFilter(backend=backend).update([]) == []
+
+# The compiled kernels must really have run.
+if numba_installed:
+    assert filters._jit_clip.signatures and filters._jit_median.signatures
+
+
+"""Histogram Median Mode Tests"""
+
+# The counters of a histogram bin must hold all D+1 samples, also right at the edge
+# between the int8 and int16 counter types.
+for histogram_D in [126, 127, 128]:
+    histogram_filter = filters.TemporalFilter(histogram_D, median_mode="histogram",
+                                              resolution=1, value_range=(0, 200))
+    histogram_scans = np.full((histogram_D + 1, 3), 5.0)
+    histogram_scans[::2, 1] = 7.0
+    histogram_medians = histogram_filter.update_batch(histogram_scans)
+    assert np.array_equal(histogram_medians[-1], np.median(histogram_scans, axis=0))
+
+
+"""Stored Dtype Tests"""
+
+# int64 scans, like np.array([1, 2]) , are stored as float64, so their medians keep
+# their fractions and float scans can follow them.
+int64_filter = filters.TemporalFilter(3)
+assert int64_filter.update(np.array([1, 2])) == [1.0, 2.0]
+assert int64_filter.update(np.array([2, 4])) == [1.5, 3.0]
+assert int64_filter.update([1.5, 0.0]) == [1.5, 2.0]
+assert filters.TemporalFilter(3).update_batch(np.array([[1, 2], [2, 4]])).dtype == np.float64
+assert filters.TemporalFilter(3).update_array(np.array([1, 2], dtype=np.uint16)).dtype == np.uint16
+
+
+"""Median Mode and Batch Tests"""
+
+# The other ways of taking the medians must return exactly what the "full" median mode
+# returns scan by scan, with NaN and inf in the scans and for even warm-up counts.
+def make_median_scans(count, length):
+    scans = get_really_random_numbers(count * length).reshape(count, length)
+    scans[rng.random(scans.shape) < 0.05] = np.nan
+    scans[rng.random(scans.shape) < 0.05] = np.inf
+    scans[rng.random(scans.shape) < 0.05] = -np.inf
+    return scans
+
+
+def full_medians(D, scans, nonfinite="pass"):
+    full_filter = filters.TemporalFilter(D, nonfinite=nonfinite)
+    return np.array([full_filter.update_array(scan) for scan in scans])
+
+
+median_scans = make_median_scans(40, 150)
+for median_D in [0, 1, 2, 3, 6, 9]:
+    for nonfinite in ["pass", "missing"]:
+        expected = full_medians(median_D, median_scans, nonfinite)
+
+        # The "incremental" median mode.
+        incremental_filter = filters.TemporalFilter(median_D, median_mode="incremental", nonfinite=nonfinite)
+        incremental = np.array([incremental_filter.update_array(scan) for scan in median_scans])
+        assert np.array_equal(incremental, expected, equal_nan=True)
+
+        # update_batch in chunks of several sizes, mixed with single updates.
+        for chunk_size in [1, 2, 5, 17, 40]:
+            batch_filter = filters.TemporalFilter(median_D, nonfinite=nonfinite)
+            batches = []
+            for start in range(0, len(median_scans), chunk_size):
+                chunk = median_scans[start:start + chunk_size]
+                if start // chunk_size % 3 == 2:
+                    batches.extend(batch_filter.update_array(scan) for scan in chunk)
+                else:
+                    batches.extend(batch_filter.update_batch(chunk))
+            assert np.array_equal(np.array(batches), expected, equal_nan=True)
+
+        # update_batch sorting a few rows at a time.
+        batch_elements = filters._BATCH_ELEMENTS
+        filters._BATCH_ELEMENTS = 3 * (median_D + 1) * median_scans.shape[1]
+        batch_filter = filters.TemporalFilter(median_D, nonfinite=nonfinite)
+        assert np.array_equal(batch_filter.update_batch(median_scans), expected, equal_nan=True)
+        filters._BATCH_ELEMENTS = batch_elements
+
+        # Several threads, also for scans shorter than they are usually split at.
+        thread_min_length = filters._THREAD_MIN_LENGTH
+        filters._THREAD_MIN_LENGTH = 1
+        threaded_filter = filters.TemporalFilter(median_D, nonfinite=nonfinite, workers=3)
+        threaded = np.array([threaded_filter.update_array(scan) for scan in median_scans[:20]])
+        threaded = np.concatenate([threaded, threaded_filter.update_batch(median_scans[20:])])
+        filters._THREAD_MIN_LENGTH = thread_min_length
+        assert np.array_equal(threaded, expected, equal_nan=True)
+
+    # Change-gated updates with a tolerance of 0, on scans that barely change.
+    gated_scans = median_scans.copy()
+    gated_scans[1:, ::2] = gated_scans[0, ::2]
+    gated_filter = filters.TemporalFilter(median_D, tolerance=0)
+    gated = np.array([gated_filter.update_array(scan) for scan in gated_scans])
+    assert np.array_equal(gated, full_medians(median_D, gated_scans), equal_nan=True)
+    gated_filter = filters.TemporalFilter(median_D, tolerance=0)
+    gated = np.array([gated_filter.update_array(scan) for scan in median_scans])
+    assert np.array_equal(gated, full_medians(median_D, median_scans), equal_nan=True)
+
+    # ParallelReprocessor stitching its chunks together.
+    for chunk_size in [1, 4, 7, 40]:
+        reprocessor = filters.ParallelReprocessor(median_D, workers=1, chunk_size=chunk_size)
+        assert np.array_equal(reprocessor.run(median_scans), full_medians(median_D, median_scans), equal_nan=True)
+    reprocessor = filters.ParallelReprocessor(median_D, range_min=2, range_max=40, workers=2, chunk_size=6)
+    range_filter = filters.RangeFilter(2, 40)
+    range_scans = np.array([range_filter.update_array(scan) for scan in median_scans])
+    assert np.array_equal(reprocessor.run(median_scans), full_medians(median_D, range_scans), equal_nan=True)
+
+
+# Integer medians are the means of the two middle samples rounded down, also for
+# samples of opposite signs near the ends of the dtype.
+int16_scans = make_backend_scans("int16")[:12]
+for median_D in [1, 2, 3, 6]:
+    expected = np.array([np.floor(np.median(int16_scans[max(0, t - median_D):t + 1].astype(np.int64), axis=0))
+                         for t in range(len(int16_scans))]).astype(np.int16)
+    for mode in ["full", "incremental"]:
+        int16_filter = filters.TemporalFilter(median_D, median_mode=mode)
+        assert np.array_equal([int16_filter.update_array(scan) for scan in int16_scans], expected)
+    assert np.array_equal(filters.TemporalFilter(median_D).update_batch(int16_scans), expected)
+    int16_filter = filters.TemporalFilter(median_D, tolerance=0)
+    assert np.array_equal([int16_filter.update_array(scan) for scan in int16_scans], expected)
+
+
+"""SpatioTemporalFilter Tests"""
+
+# The medians must be the ones of every neighbourhood taken one by one. A neighbourhood
+# that wraps holds every beam at most once, however large the radius.
+def neighbourhood_medians(scans, D, radius, wrap):
+    beams = scans.shape[-1]
+    medians = np.empty(scans.shape)
+    for t in range(len(scans)):
+        window = scans[max(0, t - D):t + 1]
+        for n in range(beams):
+            if wrap:
+                r = min(radius, (beams - 1) // 2)
+                neighbours = np.arange(n - r, n + r + 1) % beams
+            else:
+                neighbours = np.arange(max(0, n - radius), min(beams, n + radius + 1))
+            neighbourhood = np.moveaxis(window[..., neighbours], -2, 0).reshape(window.shape[-2], -1)
+            medians[t, :, n] = np.median(neighbourhood, axis=1)
+    return medians
+
+
+for beams in [1, 2, 5, 8]:
+    spatial_scans = get_really_random_numbers(6 * 3 * beams).reshape(6, 3, beams)
+    for radius in [0, 1, 2, 4]:
+        for wrap in [True, False]:
+            expected = neighbourhood_medians(spatial_scans, 2, radius, wrap)
+            for backend in backends:
+                spatial_filter = filters.SpatioTemporalFilter(2, radius=radius, wrap=wrap, backend=backend)
+                assert np.array_equal([spatial_filter.update_array(scan) for scan in spatial_scans], expected)
+                spatial_filter = filters.SpatioTemporalFilter(2, radius=radius, wrap=wrap, backend=backend)
+                assert np.array_equal([spatial_filter.update_array(scan[0]) for scan in spatial_scans], expected[:, 0])
+
+# Empty scans give empty medians, like a TemporalFilter.
+assert filters.SpatioTemporalFilter(2).update([]) == []
+
+
+"""ScanStream Tests"""
+
+# An in-process producer stands in for the sensor. It doesn't wait between scans, so
+# it fills the queue before the consumer gets a turn. Scan i holds the number i
+# and a TemporalFilter with D = 0 hands it out as it is.
+async def produce(count, error=None):
+    for i in range(count):
+        yield np.full(4, float(i))
+    if error is not None:
+        raise error
+
+
+async def consume(stream, source, delay=0):
+    numbers = []
+    async for filtered_scan in stream.filter(source):
+        numbers.append(filtered_scan[0])
+        await asyncio.sleep(delay)
+    return numbers
+
+
+for policy, kept in [("block", list(range(10))), ("drop_oldest", [7, 8, 9]), ("drop_newest", [0, 1, 2])]:
+    for threshold in [100000, 1]:
+        stream = lidarstream.ScanStream(filters.TemporalFilter(0), maxsize=3, policy=policy,
+                                        executor_threshold=threshold)
+        assert asyncio.run(consume(stream, produce(10), delay=0.001)) == kept
+        assert (stream._received, stream._dropped, stream._filtered) == (10, 10 - len(kept), len(kept))
+
+    # Errors raised by the source come through after the scans read before them.
+    stream = lidarstream.ScanStream(filters.TemporalFilter(0), maxsize=3, policy=policy)
+    try:
+        asyncio.run(consume(stream, produce(2, ValueError("sensor lost"))))
+    except ValueError as error:
+        assert str(error) == "sensor lost"
+    else:
+        raise AssertionError("the error of the source was lost")
+    assert (stream._received, stream._dropped, stream._filtered) == (2, 0, 2)
+
+
+"""Statistics Tests"""
+
+# The statistics must match np.mean, np.percentile and a trimmed mean of the sorted samples
+# of every window. np.percentile turns a percentile between a sample and an equal or
+# infinite one into NaN, so the percentiles of windows with infinities are interpolated here.
+def column_statistics(column, proportion=.2):
+    column = np.sort(column)
+    if len(column) == 0 or np.isnan(column[-1]):
+        return np.nan, np.nan, np.nan
+    with np.errstate(invalid="ignore"):
+        mean = np.mean(column)
+        position = (len(column) - 1) * (10 / 100)
+        low, high = column[int(position)], column[min(int(position) + 1, len(column) - 1)]
+        fraction = position - int(position)
+        p10 = low + (high - low) * fraction if fraction < .5 else high - (high - low) * (1 - fraction)
+        if fraction == 0 or low == high:
+            p10 = low
+        if np.isfinite(column).all():
+            assert p10 == np.percentile(column, 10)
+        cut = int(proportion * len(column))
+        trimmed = np.mean(column[cut:len(column) - cut])
+    return mean, p10, trimmed
+
+
+def window_statistics(window, skip_missing, dropout=None):
+    statistics = np.empty((3, window.shape[1]))
+    for n in range(window.shape[1]):
+        column = window[:, n].astype(np.float64)
+        if skip_missing:
+            column = column[np.isfinite(column)]
+        if dropout is not None:
+            column = column[column != dropout]
+        statistics[:, n] = column_statistics(column)
+    if window.dtype.kind in "iu":
+        statistics = np.where(np.isnan(statistics), dropout, np.floor(statistics)).astype(window.dtype)
+    return dict(zip(["mean", "p10", "trim20"], statistics))
+
+
+# The means are summed in another order, so only the percentiles are exactly the same.
+def check_statistics(expected, statistics):
+    for name, values in statistics.items():
+        if name == "p10":
+            assert np.array_equal(values, expected[name], equal_nan=True)
+        else:
+            assert np.allclose(values, expected[name], equal_nan=True)
+
+
+statistic_names = ("mean", "p10", "trim20")
+statistic_scans = make_median_scans(30, 60)
+uint16_scans = make_backend_scans("uint16")[:, :60]
+for statistics_D in [0, 1, 4, 7]:
+    for scans, nonfinite, dropout in [(statistic_scans, "pass", None), (statistic_scans, "missing", None),
+                                      (uint16_scans, "pass", 0)]:
+        skip_missing = nonfinite == "missing"
+        expected = [window_statistics(scans[max(0, t - statistics_D):t + 1], skip_missing, dropout)
+                    for t in range(len(scans))]
+
+        # All of them at once, one scan at a time.
+        statistics_filter = filters.TemporalFilter(statistics_D, nonfinite=nonfinite, dropout=dropout,
+                                                   statistics=statistic_names)
+        for t, scan in enumerate(scans):
+            statistics_filter.update_array(scan)
+            check_statistics(expected[t], statistics_filter._current_statistics)
+
+        # Each on its own with update_batch, after a few single updates.
+        for name in statistic_names:
+            batch_filter = filters.TemporalFilter(statistics_D, nonfinite=nonfinite, dropout=dropout, statistics=name)
+            batches = [batch_filter.update_array(scan) for scan in scans[:3]]
+            batches.extend(batch_filter.update_batch(scans[3:]))
+            check_statistics({name: np.array([values[name] for values in expected])}, {name: np.array(batches)})
+
+        # update_timed drops the scans older than max_age from the window, and their
+        # samples from the running sums of the mean.
+        timestamps = np.cumsum(rng.choice([0.1, 0.5, 2.0], len(scans)))
+        timed_filter = filters.TemporalFilter(statistics_D, nonfinite=nonfinite, dropout=dropout,
+                                              statistics=statistic_names, max_age=1.5)
+        for t, scan in enumerate(scans):
+            timed_filter.update_timed(scan, timestamps[t])
+            first = max(t - statistics_D, int(np.searchsorted(timestamps, timestamps[t] - 1.5)))
+            check_statistics(window_statistics(scans[first:t + 1], skip_missing, dropout),
+                             timed_filter._current_statistics)
+
+
+"""Saved State Tests"""
+
+# A filter that loads the state saved by another one must carry on with the same results.
+state_path = os.path.join(tempfile.mkdtemp(), "temporal_filter_state.log")
+state_scans = make_median_scans(12, 50)
+state_scans[np.isinf(state_scans)] = 30.0  # the histograms need finite samples
+for make_state_filter in [lambda: filters.TemporalFilter(4),
+                          lambda: filters.TemporalFilter(4, median_mode="incremental"),
+                          lambda: filters.TemporalFilter(4, median_mode="histogram", nonfinite="missing",
+                                                         resolution=0.5, value_range=(-10, 60)),
+                          lambda: filters.TemporalFilter(4, statistics=("median", "mean", "p10"))]:
+    for saved in [0, 2, 8]:
+        saving_filter = make_state_filter()
+        for scan in state_scans[:saved]:
+            saving_filter.update_array(scan)
+        saving_filter.save_state(state_path)
+        loading_filter = make_state_filter()
+        loading_filter.load_state(state_path)
+        for scan in state_scans[saved:]:
+            assert np.array_equal(loading_filter.update_array(scan), saving_filter.update_array(scan), equal_nan=True)
+
+# The timestamps of a timed filter are saved with its scans.
+state_timestamps = np.cumsum(rng.choice([0.1, 0.5, 2.0], len(state_scans)))
+saving_filter = filters.TemporalFilter(4, max_age=1.5)
+for t in range(6):
+    saving_filter.update_timed(state_scans[t], state_timestamps[t])
+saving_filter.save_state(state_path)
+loading_filter = filters.TemporalFilter(4, max_age=1.5)
+loading_filter.load_state(state_path)
+for t in range(6, len(state_scans)):
+    assert np.array_equal(loading_filter.update_timed(state_scans[t], state_timestamps[t]),
+                          saving_filter.update_timed(state_scans[t], state_timestamps[t]), equal_nan=True)
+
+# Range images are saved flattened and come back in the shape of the next scan.
+image_scans = state_scans.reshape(len(state_scans), 5, 10)
+saving_filter = filters.TemporalFilter(3)
+for scan in image_scans[:5]:
+    saving_filter.update_array(scan)
+saving_filter.save_state(state_path)
+loading_filter = filters.TemporalFilter(3)
+loading_filter.load_state(state_path)
+for scan in image_scans[5:]:
+    loaded_medians = loading_filter.update_array(scan)
+    assert loaded_medians.shape == (5, 10)
+    assert np.array_equal(loaded_medians, saving_filter.update_array(scan), equal_nan=True)
+os.remove(state_path)
+os.rmdir(os.path.dirname(state_path))
+
+
+"""Timed Update Tests"""
+
+# update_timed takes the medians over the scans no more than max_age older than the newest,
+# and at most D+1 of them, so the bound on D kicks in when scans arrive close together.
+timed_scans = make_median_scans(40, 50)
+timed_timestamps = np.cumsum(rng.choice([0.0, 0.1, 0.5, 2.0], len(timed_scans)))
+for timed_D in [0, 2, 5]:
+    for nonfinite in ["pass", "missing"]:
+        for backend in backends:
+            timed_filter = filters.TemporalFilter(timed_D, nonfinite=nonfinite, max_age=1.0, backend=backend)
+            for t, scan in enumerate(timed_scans):
+                first = max(t - timed_D, int(np.searchsorted(timed_timestamps, timed_timestamps[t] - 1.0)))
+                window = timed_scans[first:t + 1]
+                with warnings.catch_warnings(), np.errstate(invalid="ignore"):
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    if nonfinite == "missing":
+                        expected = np.nanmedian(np.where(np.isfinite(window), window, np.nan), axis=0)
+                    else:
+                        expected = np.median(window, axis=0)
+                assert np.array_equal(timed_filter.update_timed(scan, timed_timestamps[t]), expected, equal_nan=True)
+
+# Timestamps must not go backwards.
+timed_filter = filters.TemporalFilter(2, max_age=1.0)
+timed_filter.update_timed([1.0, 2.0], 5.0)
+try:
+    timed_filter.update_timed([1.0, 2.0], 4.0)
+except TypeError as error:
+    assert "backwards" in str(error)
+else:
+    raise AssertionError("update_timed took a timestamp that went backwards")
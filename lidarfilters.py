@@ -1,20 +1,804 @@
 """
 Filters for LIDAR scans
 """
+import bisect
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import numpy as np
 
+import scanlog
+
+# numba is optional. Without it the "jit" backend isn't available. It takes about half
+# a second to import, so _load_jit imports it the first time the "jit" backend is asked for.
+numba = None
+
+# The largest number of samples update_batch sorts at once.
+_BATCH_ELEMENTS = 1 << 22
+
+# Upper edges (in seconds) of the buckets of the latency histograms kept by FilterStats,
+# from 1 microsecond doubling up to about 17 seconds. Slower calls go in one more bucket.
+_LATENCY_EDGES = [1e-6 * 2 ** k for k in range(25)]
+
+# Scans shorter than this are never split between threads since the threads would cost
+# more than they save.
+_THREAD_MIN_LENGTH = 1 << 15
+
+# What the filters can do with NaN and infinite numbers in a scan.
+_NONFINITE_POLICIES = ("pass", "raise", "missing")
+
+# The kernels the filters can clamp and take medians with.
+_BACKENDS = ("python", "numpy", "jit")
+
+
+def _as_scan_array(scan, validate=True):
+    """Checks a scan and returns it as an np.ndarray of numbers.
+
+    A scan is usually one-dimensional, but it can also be a range image of any shape,
+    I.e. (rings, beams), given as an np.ndarray or as nested lists.
+    An np.ndarray of numbers is returned as is (booleans are turned into float64)
+    and a list is checked number by number and turned into a float64 np.ndarray .
+    If validate is False nothing is checked.
+    """
+    if validate is False:
+        return scan if isinstance(scan, np.ndarray) else np.asarray(scan, dtype=np.float64)
+
+    # np.ndarrays are checked by their dtype and shape rather than number by number.
+    if isinstance(scan, np.ndarray):
+        if scan.ndim == 0 or scan.dtype.kind not in 'biuf':
+            raise TypeError('The update method takes a scan as a parameter.'
+                            ' Scan should be a list of numbers.')
+        if scan.dtype.kind == 'b':
+            scan = scan.astype(np.float64)
+        return scan
+
+    # Check to see if the scan is a list.
+    if isinstance(scan, list) is False:
+        raise TypeError("TemporalFilter's update method takes a list of numbers as its argument.")
+
+    # A range image comes as a list of lists, which numpy checks as a whole.
+    # It has to be rectangular and hold nothing but numbers.
+    if scan and isinstance(scan[0], list):
+        try:
+            image = np.array(scan)
+        except ValueError:
+            image = None
+        if image is None or image.dtype.kind not in 'biuf':
+            raise TypeError('The update method takes a scan as a parameter.'
+                            ' Scan should be a list of numbers or a range image of lists of numbers.')
+        return image.astype(np.float64)
+
+    # Check that scan is just a list of numbers.
+    for i in range(len(scan)):
+        if isinstance(scan[i], float) is False:
+            if isinstance(scan[i], int) is False:
+                raise TypeError('The update method takes a scan as a parameter.'
+                                ' Scan should be a list of numbers.')
+
+    return np.array(scan, dtype=np.float64)
+
+
+def _as_scan_stack(scans, validate=True):
+    """Checks a group of consecutive scans and returns it as a (T, N) np.ndarray ,
+    or a (T, *shape) np.ndarray for range images.
+
+    scans can be an np.ndarray of two or more dimensions or a list of scans of equal shape.
+    If validate is False nothing is checked.
+    """
+    if validate is False:
+        return scans if isinstance(scans, np.ndarray) else np.asarray(scans, dtype=np.float64)
+
+    # np.ndarrays are checked by their dtype and shape.
+    if isinstance(scans, np.ndarray):
+        if scans.ndim < 2 or scans.dtype.kind not in 'biuf':
+            raise TypeError('The update_batch method takes a two-dimensional array of numbers'
+                            ' as a parameter. Each row should be a scan.')
+        if scans.dtype.kind == 'b':
+            scans = scans.astype(np.float64)
+        return scans
+
+    if isinstance(scans, list) is False:
+        raise TypeError('The update_batch method takes a list of scans or a two-dimensional'
+                        ' np.ndarray as its argument.')
+
+    # Check every scan on its own, then make sure they all have the same length.
+    scans = [_as_scan_array(scan).astype(np.float64) for scan in scans]
+    if len(set(scan.shape for scan in scans)) > 1:
+        raise TypeError('All the scans passed to update_batch must have the same length.')
+    if not scans:
+        return np.empty((0, 0))
+    return np.stack(scans)
+
+
+def _check_nonfinite_policy(nonfinite):
+    """Makes sure nonfinite is a policy the filters know."""
+    if nonfinite not in _NONFINITE_POLICIES:
+        raise TypeError('nonfinite must be "pass", "raise" or "missing"')
+
+
+def _apply_nonfinite(scans, policy, invalid=None):
+    """Applies a policy for NaN and infinite numbers to an np.ndarray of scans.
+
+    "pass" leaves them alone, "raise" raises a TypeError if there are any
+    and "missing" turns them all into NaN, which the filters treat as a missing measurement.
+    Samples where invalid is True are invalid returns (see _invalid_returns),
+    which never raise.
+    """
+    # Integers are always finite.
+    if policy == "pass" or scans.dtype.kind != 'f':
+        return scans
+
+    finite = np.isfinite(scans)
+    if invalid is not None:
+        finite |= invalid
+    if finite.all():
+        return scans
+    if policy == "raise":
+        raise TypeError('The scan contains NaN or infinite numbers.')
+    return np.where(finite, scans, np.nan)
+
+
+def _invalid_returns(scans, dropout=None, mask=None):
+    """Returns a boolean array that is True for the samples of scans that are invalid returns,
+    those equal to dropout or where mask is True, or None if there aren't any."""
+    invalid = None
+    if mask is not None:
+        # Integer scans have no NaN, so masked samples can only be marked by setting them to dropout.
+        if dropout is None and scans.dtype.kind != 'f':
+            raise TypeError('Integer scans need a dropout value to mark the samples left out by mask.')
+        invalid = np.asarray(mask, dtype=bool)
+        if invalid.shape != scans.shape:
+            raise TypeError('The mask must have the same shape as the scan.')
+    if dropout is not None:
+        dropped = scans == dropout
+        invalid = dropped if invalid is None else invalid | dropped
+    if invalid is None or not invalid.any():
+        return None
+    return invalid
+
+
+def _check_dropout(dropout):
+    """Makes sure dropout is None or a number a scan can be compared with."""
+    if dropout is None:
+        return
+    if isinstance(dropout, (float, int)) is False or dropout != dropout:
+        raise TypeError('dropout must be a float or int (use nonfinite="missing" for NaN)')
+
+
+def _stored_dtype(dtype):
+    """Returns the dtype a TemporalFilter stores scans of dtype in. Integers wider than
+    32 bits, like the int64 of np.array([1, 2]), are stored as float64 so their medians
+    aren't rounded down and later float scans can be stored with them."""
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'iu' and dtype.itemsize > 4:
+        return np.dtype(np.float64)
+    return dtype
+
+
+def _parse_statistics(statistics):
+    """Checks the statistics a TemporalFilter is asked for and returns them as a tuple of
+    (name, kind, parameter) where kind is "median", "mean", "percentile" or "trimmed"
+    and parameter the percentile or the proportion cut off each end."""
+    if isinstance(statistics, str):
+        statistics = (statistics,)
+    if isinstance(statistics, (tuple, list)) is False or len(statistics) == 0:
+        raise TypeError("statistics must be a str or a tuple of str")
+
+    parsed = []
+    for name in statistics:
+        kind, parameter = name, None
+        try:
+            if isinstance(name, str) is False:
+                kind = None
+            elif name.startswith("trim"):
+                kind, parameter = "trimmed", float(name[4:]) / 100
+            elif name.startswith("p"):
+                kind, parameter = "percentile", float(name[1:])
+        except ValueError:
+            kind = None
+        if (kind not in ("median", "mean", "percentile", "trimmed")
+                or (kind == "percentile" and not 0 <= parameter <= 100)
+                or (kind == "trimmed" and not 0 <= parameter < .5)):
+            raise TypeError('Every statistic must be "median", "mean", "p" and a percentile '
+                            'such as "p10" or "trim" and a percentage below 50 such as "trim10"')
+        parsed.append((name, kind, parameter))
+
+    if len(set(statistics)) < len(statistics):
+        raise TypeError("Every statistic can only be asked for once")
+    return tuple(parsed)
+
+
+def _resolve_backend(backend):
+    """Makes sure backend is one the filters know and returns the one to use.
+    "auto" is "numpy", which is faster than the compiled per-index loops for most windows."""
+    if backend == "auto":
+        return "numpy"
+    if backend not in _BACKENDS:
+        raise TypeError('backend must be "auto", "python", "numpy" or "jit"')
+    if backend == "jit" and _load_jit() is False:
+        raise TypeError('The "jit" backend needs numba, which is not installed')
+    return backend
+
+
+def _load_jit():
+    """Imports numba and compiles the kernels of the "jit" backend the first time it's called.
+    Returns False if numba isn't installed."""
+    global numba, _jit_clip, _jit_median
+    if numba is None:
+        try:
+            import numba as module
+        except ImportError:
+            return False
+
+        # The same kernels compiled by numba. They release the GIL, so _in_chunks can run
+        # them on several threads at once.
+        _jit_clip = module.njit(nogil=True, cache=True)(_python_clip)
+        _jit_median = module.njit(nogil=True, cache=True)(_python_median)
+        numba = module
+    return True
+
+
+def _python_clip(source, low, high, target):
+    """Clamps the one-dimensional array source into target one number at a time, like np.clip ."""
+    for i in range(len(source)):
+        measurement = source[i]
+        if measurement < low:
+            measurement = low
+        if measurement > high:
+            measurement = high
+        target[i] = measurement
+
+
+def _python_median(samples, integer, skip_nan, use_dropout, dropout, empty, out):
+    """Writes the median of every column of samples into out one index at a time.
+
+    NaN makes the median of its index NaN unless skip_nan is True, in which case it is
+    left out, as are the samples equal to dropout if use_dropout is True. An index with
+    nothing left gets empty. If integer is True the medians are rounded down like
+    the ones of _median_of_sorted.
+    """
+    length = samples.shape[1]
+    if length == 0:
+        return
+    column = np.empty_like(samples[:, 0])
+    for n in range(length):
+        valid = 0
+        for k in range(len(column)):
+            sample = samples[k, n]
+            if sample != sample:
+                if skip_nan:
+                    continue
+                valid = -1
+                break
+            if use_dropout and sample == dropout:
+                continue
+            column[valid] = sample
+            valid += 1
+        if valid <= 0:
+            out[n] = empty
+            continue
+
+        window = column[:valid]
+        window.sort()
+        low, high = window[(valid - 1) // 2], window[valid // 2]
+        if valid % 2 == 1:
+            out[n] = high
+        elif integer:
+            # Stored integers are at most 32 bits wide, so their sum fits in an int64.
+            out[n] = (np.int64(low) + np.int64(high)) // 2
+        else:
+            out[n] = (low + high) / 2
+
+
+# Compiled by _load_jit.
+_jit_clip = None
+_jit_median = None
+
+
+def _mean_rounded_down(low, high, out=None):
+    """Returns the means of the integers low and high rounded down, in their dtype.
+    Halving both first can't overflow the dtype like low + high, or high - low for
+    samples of opposite signs, can."""
+    medians = np.right_shift(low, 1, out=out)
+    medians += high >> 1
+    medians += low & high & 1
+    return medians
+
+
+def _replace_sorted(window, count, new, evicted=None):
+    """Updates the sorted columns of window in place.
+
+    Column n of window holds count sorted samples of index n (NaNs last).
+    If evicted is given one copy of evicted[n] is removed from column n, then
+    new[n] is inserted into column n so that the column stays sorted.
+    Nothing gets re-sorted. Both steps are a few elementwise passes over window.
+
+    Returns the number of samples now stored in every column.
+    """
+    # Remove the evicted samples. Samples in front of an evicted sample stay where
+    # they are and the ones from the evicted sample on move one place up.
+    # A NaN is never >= anything, so an evicted NaN takes the last sample with it.
+    if evicted is None:
+        remaining = window[:count]
+    else:
+        remaining = np.where(window[:count - 1] >= evicted, window[1:count], window[:count - 1])
+        count -= 1
+
+    if count == 0:
+        window[0] = new
+        return 1
+
+    # Insert the new samples. The sample at place j becomes the smaller one of
+    # remaining[j] and max(new, remaining[j-1]), which is remaining[j] in front of
+    # the new sample, new at its place and remaining[j-1] behind it. fmin makes
+    # a NaN in remaining (which can only be at the end) lose to any number,
+    # and a NaN new sample lose to everything so it ends up last.
+    window[count] = np.maximum(new, remaining[count - 1])
+    np.fmin(remaining[1:], np.maximum(new, remaining[:-1]), out=window[1:count])
+    window[0] = np.fmin(remaining[0], new)
+    return count + 1
 
-class RangeFilter:
+
+def _median_of_sorted(window, count, out=None):
+    """Returns the median of the first count samples in every sorted column of window.
+
+    The result is the same as np.median over those samples, including
+    the mean of the two middle samples for an even count and NaN for a column holding a NaN.
+    For integer samples the median keeps their dtype, so the mean of the two middle
+    samples is rounded down.
+    """
+    middle = count // 2
+    if count % 2:
+        if out is None:
+            medians = window[middle].copy()
+        else:
+            medians = out
+            medians[...] = window[middle]
+    elif window.dtype.kind in 'iu':
+        return _mean_rounded_down(window[middle - 1], window[middle], out)
+    else:
+        # -inf and inf in the middle give NaN, like np.median.
+        with np.errstate(invalid="ignore"):
+            medians = np.mean(window[middle - 1:middle + 1], axis=0, out=out)
+
+    # np.median returns NaN for any index whose samples hold a NaN. NaNs are sorted last.
+    if count and window.dtype.kind == 'f':
+        medians[np.isnan(window[count - 1])] = np.nan
+    return medians
+
+
+def _missing_run(window, dropout=None):
+    """Finds the missing samples of every sorted column of window (see _median_of_valid).
+
+    Returns a boolean array that is True for them, the number of them in every column
+    and the number of samples in front of them, which is where they start.
+    """
+    if dropout is None:
+        missing = np.isnan(window)
+        skipped = np.count_nonzero(missing, axis=0)
+        return missing, skipped, len(window) - skipped
+    missing = window == dropout
+    return missing, np.count_nonzero(missing, axis=0), np.count_nonzero(window < dropout, axis=0)
+
+
+def _take_ranks(window, ranks, skipped, in_front):
+    """Returns the samples of every sorted column of window that have the given ranks
+    (counting from 0 in sorted order) among the samples that aren't missing.
+    ranks holds one row of ranks per sample to return."""
+    positions = ranks + skipped * (ranks >= in_front)
+    # Columns without a valid sample would point past their end.
+    np.clip(positions, 0, len(window) - 1, out=positions)
+    return np.take_along_axis(window, positions, axis=0)
+
+
+def _median_of_valid(window, out=None, dropout=None):
+    """Returns the median of the samples in every sorted column of window that aren't missing.
+
+    Missing samples are NaN, which sorting puts at the end of a column, or in an integer
+    window equal to dropout, which sorting puts next to each other somewhere in the column.
+    The median is read off the middle of the other samples, jumping over the missing ones.
+    This is the same as np.nanmedian, without its slow fallback for columns that hold NaNs.
+    A column holding only missing samples gets NaN, or dropout in an integer window.
+    """
+    _, skipped, in_front = _missing_run(window, dropout)
+    valid = len(window) - skipped
+
+    # The two middle samples are the same one for an odd number of samples.
+    low, high = _take_ranks(window, np.stack([(valid - 1) // 2, valid // 2]), skipped, in_front)
+    if window.dtype.kind in 'iu':
+        # Rounded down like _median_of_sorted. A column of dropouts gets dropout anyway.
+        medians = _mean_rounded_down(low, high)
+    else:
+        medians = np.where(valid % 2 == 1, high, (low + high) / 2)
+        medians[valid == 0] = np.nan
+
+    if out is None:
+        return medians
+    out[...] = medians
+    return out
+
+
+def _percentile_of_sorted(window, q, skip_missing, dropout=None):
+    """Returns the q-th percentile of every sorted column of window as float64, interpolating
+    linearly between the two nearest samples like np.percentile does.
+
+    If skip_missing is True the missing samples are left out as in _median_of_valid.
+    Otherwise a NaN makes the percentile of its column NaN, like np.percentile .
+    """
+    if skip_missing:
+        _, skipped, in_front = _missing_run(window, dropout)
+    else:
+        skipped, in_front = np.zeros(window.shape[1], dtype=np.intp), len(window)
+    valid = len(window) - skipped
+
+    # The percentile lies fraction of the way from the sample of rank lower to the next one.
+    position = q / 100 * np.maximum(valid - 1, 0)
+    lower = np.floor(position).astype(np.intp)
+    fraction = position - lower
+    ranks = np.stack([lower, np.minimum(lower + 1, np.maximum(valid - 1, 0))])
+    low, high = _take_ranks(window, ranks, skipped, in_front).astype(np.float64)
+    with np.errstate(invalid="ignore"):
+        # np.percentile interpolates from the nearer sample, which rounds differently.
+        # Between two equal samples, such as two infinities, the percentile is that sample.
+        percentiles = np.where(fraction < .5, low + (high - low) * fraction, high - (high - low) * (1 - fraction))
+        percentiles = np.where((fraction == 0) | (low == high), low, percentiles)
+
+    percentiles[valid == 0] = np.nan
+    if skip_missing is False and window.dtype.kind == 'f':
+        percentiles[np.isnan(window[-1])] = np.nan
+    return percentiles
+
+
+def _trimmed_mean_of_sorted(window, proportion, skip_missing, dropout=None):
+    """Returns the mean of every sorted column of window as float64, leaving out
+    the proportion of its lowest samples and the same proportion of its highest ones,
+    like scipy.stats.trim_mean . Missing samples are handled as by _percentile_of_sorted.
+    """
+    if skip_missing:
+        missing, skipped, in_front = _missing_run(window, dropout)
+    else:
+        missing, skipped, in_front = None, np.zeros(window.shape[1], dtype=np.intp), len(window)
+    valid = len(window) - skipped
+    cut = np.floor(proportion * valid).astype(np.intp)
+
+    # Sum the samples whose rank among the valid samples is in the kept middle part.
+    positions = np.arange(len(window))[:, None]
+    ranks = np.where(positions < in_front, positions, positions - skipped)
+    kept = (ranks >= cut) & (ranks < valid - cut)
+    if missing is not None:
+        kept &= ~missing
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sums = np.sum(np.where(kept, window, 0), axis=0, dtype=np.float64)
+        means = sums / (valid - 2 * cut)
+
+    means[valid == 0] = np.nan
+    if skip_missing is False and window.dtype.kind == 'f':
+        means[np.isnan(window[-1])] = np.nan
+    return means
+
+
+class _HistogramMedian:
+    """The per index histograms used by the "histogram" median mode of TemporalFilter.
+
+    Every index n of a scan has a histogram counts[n] of its stored samples over bins
+    of width resolution starting at value_range[0], plus the totals of blocks of
+    _BLOCK bins. Two pointers per index follow the bins holding the two middle samples,
+    so adding and removing a sample is a counter change and finding the medians
+    usually only moves the pointers a bin or two. Indexes whose median jumped further
+    are looked up through the block totals instead. None of it depends on D.
+    Samples that are NaN or equal to dropout are counted as missing instead.
+    """
+    _BLOCK = 64
+    _STEPS = 4
+
+    def __init__(self, length, D, resolution, value_range, dropout=None):
+        self._low = value_range[0]
+        self._dropout = dropout
+        self._resolution = resolution
+        self._bins = int(np.rint((value_range[1] - value_range[0]) / resolution)) + 1
+        blocks = -(-self._bins // self._BLOCK)
+        # The smallest signed integers that can count D+1 samples. A signed type holding
+        # -(D+2) holds D+1 too, which -(D+1) alone wouldn't tell (int8 holds -128, not 128).
+        count_dtype = np.result_type(np.min_scalar_type(-(D + 2)), np.int8)
+        self._counts = np.zeros((length, blocks * self._BLOCK), dtype=count_dtype)
+        self._block_counts = np.zeros((length, blocks), dtype=count_dtype)
+        # Row 0 follows the lower middle sample and row 1 the upper one.
+        self._pointers = np.zeros((2, length), dtype=np.intp)
+        self._below = np.zeros((2, length), dtype=np.intp)
+        self._missing = np.zeros(length, dtype=np.intp)
+
+        # Counters are reached through flat indices, which is faster than (row, bin) pairs.
+        self._flat_counts = self._counts.reshape(-1)
+        self._flat_block_counts = self._block_counts.reshape(-1)
+        self._rows = np.arange(length)
+        self._offsets = self._rows * self._counts.shape[1]
+        self._block_offsets = self._rows * blocks
+
+
+    def add(self, scan, step):
+        """Adds (step 1) or removes (step -1) the samples of scan."""
+        bins = (scan - self._low) / self._resolution
+        np.rint(bins, out=bins)
+        np.clip(bins, 0, self._bins - 1, out=bins)
+        valid = ~np.isnan(bins)
+        if self._dropout is not None:
+            valid &= scan != self._dropout
+        if valid.all():
+            rows = self._rows
+            bins = bins.astype(np.intp)
+        else:
+            rows = self._rows[valid]
+            bins = bins[valid].astype(np.intp)
+            self._missing += step * ~valid
+
+        self._flat_counts[self._offsets[rows] + bins] += step
+        self._flat_block_counts[self._block_offsets[rows] + bins // self._BLOCK] += step
+        for pointer, below in zip(self._pointers, self._below):
+            below[rows] += step * (bins < pointer[rows])
+
+
+    def medians(self, count, skip_missing):
+        """Returns the medians of the samples added so far, count per index. Unless skip_missing
+        is True an index with a missing sample gets NaN, like np.median ."""
+        valid = count - self._missing
+        active = valid > 0
+        self._seek(self._pointers[0], self._below[0], (valid - 1) // 2, active)
+        self._seek(self._pointers[1], self._below[1], valid // 2, active)
+
+        # The value of a bin is its center. The two pointers meet for an odd number of samples.
+        medians = self._low + self._resolution * (self._pointers[0] + self._pointers[1]) / 2
+        if skip_missing:
+            medians[~active] = np.nan
+        else:
+            medians[self._missing > 0] = np.nan
+        return medians
+
+
+    def _seek(self, pointer, below, rank, active):
+        """Moves pointer[n] to the bin holding the sample of rank rank[n] (counting from 0
+        in sorted order) for every index n where active[n] is True. below[n] is the number
+        of samples in the bins in front of pointer[n]. Both are changed in place."""
+        counts, offsets = self._flat_counts, self._offsets
+
+        # Move the pointers that are off by a few bins one bin per pass.
+        behind = np.flatnonzero(active & (rank < below))
+        ahead = np.flatnonzero(active & (rank >= below + counts[offsets + pointer]))
+        for _ in range(self._STEPS):
+            if len(behind) == 0 and len(ahead) == 0:
+                return
+            pointer[behind] -= 1
+            below[behind] -= counts[offsets[behind] + pointer[behind]]
+            behind = behind[rank[behind] < below[behind]]
+            below[ahead] += counts[offsets[ahead] + pointer[ahead]]
+            pointer[ahead] += 1
+            ahead = ahead[rank[ahead] >= below[ahead] + counts[offsets[ahead] + pointer[ahead]]]
+
+        # Find the others from scratch, first the block holding the rank and then its bin.
+        rows = np.concatenate([behind, ahead])
+        if len(rows) == 0:
+            return
+        picked = np.arange(len(rows))
+        block_counts = self._block_counts[rows]
+        totals = np.cumsum(block_counts, axis=1)
+        block = np.argmax(totals > rank[rows, None], axis=1)
+        in_front = totals[picked, block] - block_counts[picked, block]
+
+        bins = block[:, None] * self._BLOCK + np.arange(self._BLOCK)
+        bin_counts = self._counts[rows[:, None], bins]
+        totals = in_front[:, None] + np.cumsum(bin_counts, axis=1)
+        offset = np.argmax(totals > rank[rows, None], axis=1)
+        pointer[rows] = bins[picked, offset]
+        below[rows] = totals[picked, offset] - bin_counts[picked, offset]
+
+
+def _reprocess_chunk(D, bounds, seed, chunk):
+    """Filters chunk, a (T, N) array of consecutive scans, as if the seed scans
+    had been passed to the filters just before it. Runs in a worker process."""
+    if bounds is not None:
+        range_filter = RangeFilter(*bounds)
+        seed = range_filter.update_batch(seed)
+        chunk = range_filter.update_batch(chunk)
+
+    # Storing the seed scans gives the filter the same state it would have
+    # after filtering everything in front of the chunk.
+    temporal_filter = TemporalFilter(D)
+    if len(seed):
+        temporal_filter._set_history(seed)
+    return temporal_filter.update_batch(chunk)
+
+
+class FilterStats:
+    """A class used to collect metrics of the updates of a filter.
+
+    Keeps the number of calls and scans, the total time, a histogram of the time
+    of every call and any counts reported by the filter (I.e. how many numbers a
+    RangeFilter clamped). If a callback is given it is called after every update
+    with a dict describing that update.
+
+    Parameters
+    ----------
+    callback : callable, optional
+        Called with a dict holding latency (seconds), scans and the counts and state of the update.
+    """
+    def __init__(self, callback=None):
+        """Initializes a FilterStats object.
+
+        Parameters
+        ----------
+        callback : callable, optional
+            Called after every update with a dict describing it.
+        """
+        self._callback = callback
+        self._calls = 0
+        self._scans = 0
+        self._seconds = 0.0
+        self._latency_max = 0.0
+        self._latency_counts = [0] * (len(_LATENCY_EDGES) + 1)
+        self._counts = {}
+        self._state = {}
+
+
+    def record(self, seconds, scans, counts=None, state=None):
+        """Adds an update that took seconds and filtered scans scans.
+
+        Parameters
+        ----------
+        seconds : float
+            How long the update took.
+        scans : int
+            How many scans the update filtered.
+        counts : dict, optional
+            Numbers that are added up over all updates.
+        state : dict, optional
+            Numbers describing the filter after the update. Only the latest ones are kept.
+        """
+        self._calls += 1
+        self._scans += scans
+        self._seconds += seconds
+        self._latency_max = max(self._latency_max, seconds)
+        self._latency_counts[bisect.bisect_left(_LATENCY_EDGES, seconds)] += 1
+        for name, value in (counts or {}).items():
+            self._counts[name] = self._counts.get(name, 0) + value
+        if state:
+            self._state.update(state)
+
+        if self._callback is not None:
+            update = {"latency": seconds, "scans": scans}
+            update.update(counts or {})
+            update.update(state or {})
+            self._callback(update)
+
+
+    def _latency_percentile(self, q):
+        """Returns the upper edge of the histogram bucket holding the q-th percentile latency."""
+        target = q / 100 * self._calls
+        seen = 0
+        for edge, count in zip(_LATENCY_EDGES + [float("inf")], self._latency_counts):
+            seen += count
+            if count and seen >= target:
+                return edge
+        return 0.0
+
+
+    def snapshot(self):
+        """Returns the metrics collected so far as a dict."""
+        snapshot = {
+            "calls": self._calls,
+            "scans": self._scans,
+            "seconds": self._seconds,
+            "latency_max": self._latency_max,
+            "latency_p50": self._latency_percentile(50),
+            "latency_p99": self._latency_percentile(99),
+            "latency_histogram": {edge: count for edge, count
+                                  in zip(_LATENCY_EDGES + [float("inf")], self._latency_counts) if count},
+        }
+        snapshot.update(self._counts)
+        snapshot.update(self._state)
+        return snapshot
+
+
+class _Instrumented:
+    """Adds opt-in metrics to a filter. While they are off the filter's only extra work
+    is checking that _stats is None."""
+    _stats = None
+
+    def enable_stats(self, callback=None):
+        """Starts collecting metrics of every update (see FilterStats).
+
+        Parameters
+        ----------
+        callback : callable, optional
+            Called after every update with a dict describing it.
+        """
+        self._stats = FilterStats(callback)
+
+
+    def disable_stats(self):
+        """Stops collecting metrics and drops the ones collected so far."""
+        self._stats = None
+
+
+    def stats(self):
+        """Returns a dict with the metrics collected so far, or None if they are off."""
+        if self._stats is None:
+            return None
+        return self._stats.snapshot()
+
+
+class _Threaded:
+    """Lets a filter split the indexes of long scans into chunks that are filtered
+    on a thread pool. Every index is filtered on its own, so the result is the same
+    as without threads. The NumPy functions used release the GIL while they run."""
+    _workers = 1
+    _pool = None
+
+    def _set_workers(self, workers):
+        """Checks and stores the number of threads."""
+        if isinstance(workers, int) is False or workers < 1:
+            raise TypeError("workers must be a positive int")
+        self._workers = workers
+
+
+    def _in_chunks(self, length, kernel):
+        """Calls kernel(start, stop) for chunks of the indexes 0 to length
+        that together cover all of them, on the thread pool if it is worth it."""
+        if self._workers == 1 or length < _THREAD_MIN_LENGTH:
+            kernel(0, length)
+            return
+
+        # The pool is started by the first scan that gets split.
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self._workers)
+        bounds = np.linspace(0, length, self._workers + 1).astype(int)
+        for done in [self._pool.submit(kernel, start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]:
+            done.result()
+
+
+    def __getstate__(self):
+        # A thread pool can't be pickled. A copy starts its own.
+        state = self.__dict__.copy()
+        state.pop("_pool", None)
+        return state
+
+
+class RangeFilter(_Instrumented, _Threaded):
     """A class used to filter a scan (one-dimensional array of numbers)
     and return the filtered version of the scan with all numbers
     now residing within a specified range.
 
+    A scan can also be a range image of any shape, I.e. (rings, beams),
+    which keeps its shape.
+
     Parameters
     ----------
     range_min : float or int, optional
         Numbers in a scan less than range_min will be set to range_min (default .03).
     range_max : float or int, optional
         Numbers in a scan greater than range_max will be set to range_max (default 50).
+    nonfinite : str, optional
+        What to do with NaN and infinite numbers in a scan (default "pass").
+        "pass" handles them like any other number, so NaN stays NaN and infinity
+        is set to range_min or range_max. "raise" raises a TypeError.
+        "missing" returns NaN for all of them so they don't look like real measurements.
+    scale : float or int, optional
+        The number of scan units in one unit of range_min and range_max (default 1).
+        I.e. RangeFilter(.03, 50, scale=1000) clamps scans in millimeters to 30-50000
+        while range_min and range_max are given in meters.
+    workers : int, optional
+        The number of threads long np.ndarray scans are split between (default 1).
+        The result is the same for any number of threads.
+    dropout : float or int, optional
+        The value a sensor reports when no return came back, I.e. 0 or infinity.
+        Samples equal to dropout are invalid returns and are returned as they are
+        instead of being clamped, so "no data" doesn't turn into a close obstacle.
+        Samples left out by the mask passed to an update are set to dropout
+        (NaN if there is no dropout, which integer scans need).
+    backend : str, optional
+        What clamps np.ndarray scans (default "auto"). "numpy" uses np.clip, "python"
+        a loop over the numbers and "jit" the same loop compiled by numba, which has
+        to be installed. "auto" is "numpy". All backends return exactly the same scans.
 
     Attributes
     ----------
@@ -22,13 +806,22 @@ class RangeFilter:
         Equal to range_min .
     _max : float or int
         Equal to range_max .
+    _nonfinite : str
+        Equal to nonfinite .
+    _scale : float or int
+        Equal to scale .
+    _dropout : float or int or None
+        Equal to dropout .
+    _backend : str
+        The backend in use, "python", "numpy" or "jit".
 
     Note
     ----------
     If range_min is greater than range_max the two will be swapped.
     """    
     # Here we set the default range_min and range_max values if they are not passed as arguments.
-    def __init__(self, range_min: float = .03, range_max: float = 50):
+    def __init__(self, range_min: float = .03, range_max: float = 50, nonfinite: str = "pass",
+                 scale: float = 1, workers: int = 1, dropout: float = None, backend: str = "auto"):
         """Initializes a RangeFilter object.
 
         Parameters
@@ -37,6 +830,16 @@ class RangeFilter:
             Numbers in a scan less than range_min will be cropped to range_min (default .03).
         range_max : float or int, optional
             Numbers in a scan greater than range_max will be cropped to range_max (default 50).
+        nonfinite : str, optional
+            "pass", "raise" or "missing" (default "pass").
+        scale : float or int, optional
+            The number of scan units in one unit of range_min and range_max (default 1).
+        workers : int, optional
+            The number of threads long np.ndarray scans are split between (default 1).
+        dropout : float or int, optional
+            The value of invalid returns, which are not clamped.
+        backend : str, optional
+            "auto", "python", "numpy" or "jit" (default "auto").
         """
         # If a range_min was passed we make sure it's a number.
         if isinstance(range_min, float) is False:
@@ -48,6 +851,18 @@ class RangeFilter:
             if isinstance(range_max, int) is False:
                 raise TypeError("range_max must be a float or int")
 
+        # The scale has to be a positive number.
+        if isinstance(scale, (float, int)) is False or scale <= 0:
+            raise TypeError("scale must be a positive float or int")
+
+        _check_nonfinite_policy(nonfinite)
+        _check_dropout(dropout)
+        self._set_workers(workers)
+        self._nonfinite = nonfinite
+        self._scale = scale
+        self._dropout = dropout
+        self._backend = _resolve_backend(backend)
+
         # Store range_max and range_min
         # in the object's _min and _max attributes.
         self._min = range_min
@@ -72,7 +887,7 @@ class RangeFilter:
             time.sleep(4)
 
 
-    def update(self, scan):
+    def update(self, scan, validate: bool = True, mask=None):
         """Updates a scan and returns a modified version
         in which all numbers now lie within a specified range.
 
@@ -80,27 +895,52 @@ class RangeFilter:
         ----------
         scan : One-dimensional array of numbers either as a list or np.ndarray .
             The scan to be modified.
+        validate : bool, optional
+            If False the scan is not checked (default True).
+            Only pass False for scans known to be fine.
+        mask : array of bools, optional
+            True for every sample of scan that is an invalid return.
+            These are set to dropout instead of being clamped.
 
         Returns
         ----------
         filtered_scan : list
             The modified scan.
         """
+        if mask is not None:
+            return self._filter(_as_scan_array(scan, validate), mask=mask).tolist()
+
         # Check to see if the scan passed to update is a numpy array .
-        # If it is we will convert it to a list.
+        # If it is we check its dtype and shape and convert it to a list.
         if isinstance(scan, np.ndarray):
+            if validate:
+                _as_scan_array(scan)
+            if scan.ndim > 1:
+                return self._filter(scan).tolist()
             scan = scan.tolist()
 
-        # Check to see if the scan is a list.
-        if isinstance(scan, list) is False:
-            raise TypeError("TemporalFilter's update method takes a list of numbers as its argument.")
+        # Otherwise it has to be a list of numbers, or lists of numbers for a range image.
+        elif validate:
+            image = _as_scan_array(scan)
+            if image.ndim > 1:
+                return self._filter(image).tolist()
+
+        # Apply the policy for NaN and infinite numbers.
+        # The scan is copied first since it's the caller's list.
+        dropout = self._dropout
+        if self._nonfinite != "pass":
+            scan = list(scan)
+            for i in range(len(scan)):
+                if math.isfinite(scan[i]) is False and scan[i] != dropout:
+                    if self._nonfinite == "raise":
+                        raise TypeError('The scan contains NaN or infinite numbers.')
+                    scan[i] = math.nan
 
-        # Check that scan is just a list of numbers. It should not be a list of lists.
-        for i in range(len(scan)):
-            if isinstance(scan[i], float) is False:
-                if isinstance(scan[i], int) is False:
-                    raise TypeError('The update method takes a scan as a parameter.'
-                                    ' Scan should be a list of numbers.')
+        if self._stats is not None:
+            start = time.perf_counter()
+
+        # range_min and range_max in the units of the scan.
+        low, high = self._min * self._scale, self._max * self._scale
 
         # Create a filtered_scan variable to store
         # the filtered measurements.
@@ -110,32 +950,259 @@ class RangeFilter:
         # if a number is bigger than _max make the number
         # equal to _max and if a number is smaller than
         # _min make the number equal to _min.
+        # Dropouts are kept as they are.
         for measurement in scan:
-            if measurement < self._min:
-                measurement = self._min
-            if measurement > self._max:
-                measurement = self._max
+            if measurement == dropout:
+                filtered_scan.append(measurement)
+                continue
+            if measurement < low:
+                measurement = low
+            if measurement > high:
+                measurement = high
 
             # Append the measurement to our filtered scan.
             filtered_scan.append(measurement)
 
+        if self._stats is not None:
+            seconds = time.perf_counter() - start
+            self._stats.record(seconds, 1, {
+                "clamped_low": sum(measurement < low and measurement != dropout for measurement in scan),
+                "clamped_high": sum(measurement > high and measurement != dropout for measurement in scan)})
+
         # Return the filtered measurements.
         return filtered_scan
 
 
-class TemporalFilter:
+    def update_array(self, scan, out=None, validate: bool = True, mask=None):
+        """Clamps a scan in a single vectorized operation and returns it as an np.ndarray .
+        Unlike update the scan is never converted to a list and the dtype
+        of an np.ndarray scan is kept.
+
+        Parameters
+        ----------
+        scan : One-dimensional array of numbers either as a list or np.ndarray .
+            The scan to be modified. A list is converted to a float64 np.ndarray .
+        out : np.ndarray, optional
+            An array the filtered scan is written into. It must have the same
+            shape as scan. Passing scan itself clamps the scan in place.
+        validate : bool, optional
+            If False the scan is not checked (default True).
+        mask : array of bools, optional
+            True for every sample of scan that is an invalid return (see update).
+
+        Returns
+        ----------
+        filtered_scan : np.ndarray
+            The modified scan (out if out was passed).
+
+        Note
+        ----------
+        range_min and range_max are cast to the dtype of the scan (after multiplying by scale).
+        For integer scans range_min is rounded up and range_max is rounded down
+        so that every returned number still lies within the specified range.
+        """
+        # Turn the scan into an np.ndarray of numbers.
+        scan = _as_scan_array(scan, validate)
+        return self._filter(scan, out, mask)
+
+
+    def _filter(self, scan, out=None, mask=None):
+        """Clamps scan, an np.ndarray that has already been checked."""
+        invalid = _invalid_returns(scan, self._dropout, mask)
+        scan = _apply_nonfinite(scan, self._nonfinite, invalid)
+
+        # Get _min and _max in the scan's dtype and clamp every measurement at once.
+        low, high = self._bounds_for(scan.dtype)
+        if self._stats is None:
+            return self._restore_invalid(self._clip(scan, low, high, out), invalid)
+        return self._restore_invalid(self._measured_clip(scan, low, high, out, 1, invalid), invalid)
+
+
+    def update_batch(self, scans, out=None, validate: bool = True, mask=None):
+        """Clamps T consecutive scans at once.
+
+        Parameters
+        ----------
+        scans : A (T, N) np.ndarray or a list of T scans of length N.
+        out : np.ndarray, optional
+            A (T, N) array the filtered scans are written into.
+        validate : bool, optional
+            If False the scans are not checked (default True).
+        mask : array of bools, optional
+            A (T, N) mask of the invalid returns in scans (see update).
+
+        Returns
+        ----------
+        filtered_scans : np.ndarray
+            A (T, N) array where row t is equal to update_array(scans[t]).
+        """
+        scans = _as_scan_stack(scans, validate)
+        invalid = _invalid_returns(scans, self._dropout, mask)
+        scans = _apply_nonfinite(scans, self._nonfinite, invalid)
+        low, high = self._bounds_for(scans.dtype)
+        if self._stats is None:
+            return self._restore_invalid(self._clip(scans, low, high, out), invalid)
+        return self._restore_invalid(self._measured_clip(scans, low, high, out, len(scans), invalid), invalid)
+
+
+    def _restore_invalid(self, filtered_scans, invalid):
+        """Sets the invalid returns of the clamped scans back to dropout, or NaN without one."""
+        if invalid is None:
+            return filtered_scans
+        filtered_scans[invalid] = np.nan if self._dropout is None else self._dropout
+        return filtered_scans
+
+
+    def _clip(self, scans, low, high, out=None):
+        """Clamps like np.clip, splitting scans between the threads. Contiguous scans
+        are split as one flat array and others along their last axis."""
+        if self._backend != "numpy":
+            return self._kernel_clip(scans, low, high, out)
+        if self._workers == 1:
+            return np.clip(scans, low, high, out=out)
+        if out is None:
+            out = np.empty_like(scans)
+        source, target = scans, out
+        if scans.flags.c_contiguous and out.flags.c_contiguous:
+            source, target = scans.reshape(-1), out.reshape(-1)
+
+        def clip(start, stop):
+            np.clip(source[..., start:stop], low, high, out=target[..., start:stop])
+
+        self._in_chunks(source.shape[-1], clip)
+        return out
+
+
+    def _kernel_clip(self, scans, low, high, out=None):
+        """Clamps like _clip with the kernel of the "python" or "jit" backend,
+        which goes through the scans as one flat array."""
+        kernel = _python_clip
+        if self._backend == "jit":
+            # A filter unpickled in another process may be the first to use it there.
+            _load_jit()
+            kernel = _jit_clip
+        if out is None:
+            out = np.empty(scans.shape, dtype=scans.dtype)
+        source = np.ascontiguousarray(scans).reshape(-1)
+        target = out.reshape(-1) if out.flags.c_contiguous else np.empty(out.size, dtype=out.dtype)
+
+        self._in_chunks(len(source), lambda start, stop: kernel(source[start:stop], low, high, target[start:stop]))
+        if out.flags.c_contiguous is False:
+            out[...] = target.reshape(out.shape)
+        return out
+
+
+    def _measured_clip(self, scans, low, high, out, count, invalid=None):
+        """Clamps like np.clip and records the time it took and how many numbers were clamped.
+        The invalid returns (see _invalid_returns) are set back afterwards, so they don't count."""
+        # Count before clamping since out may be scans itself.
+        below, above = scans < low, scans > high
+        if invalid is not None:
+            below &= ~invalid
+            above &= ~invalid
+        clamped = {"clamped_low": int(np.count_nonzero(below)),
+                   "clamped_high": int(np.count_nonzero(above))}
+        start = time.perf_counter()
+        filtered_scans = self._clip(scans, low, high, out)
+        self._stats.record(time.perf_counter() - start, count, clamped)
+        return filtered_scans
+
+
+    def _bounds_for(self, dtype):
+        """Returns _min and _max in the units of the scans, cast to dtype."""
+        low, high = self._min * self._scale, self._max * self._scale
+
+        # Floating point scans can hold the bounds directly.
+        if np.issubdtype(dtype, np.floating):
+            return dtype.type(low), dtype.type(high)
+
+        # Integer scans get the nearest integers inside the range, limited
+        # to the numbers the dtype can represent.
+        info = np.iinfo(dtype)
+        low = min(max(int(np.ceil(low)), info.min), info.max)
+        high = min(max(int(np.floor(high)), info.min), info.max)
+        return dtype.type(low), dtype.type(high)
+
+
+class TemporalFilter(_Instrumented, _Threaded):
     """A class used to find a list of median values where each median value
     is the median of values for a specific index shared between the newest scan
     and D most recent scans. I.e  median[i] = median(scanT[i], scanT-1[i], ..., scanT-D[i])
     and list of median values = (median[0], median[1], ..., median[N-1])
     where N is the length of a scan (number of values in it).
 
-    Each scan must be a one-dimensional array of numbers as a list or np.ndarray .
+    Each scan must be a one-dimensional array of numbers as a list or np.ndarray ,
+    or a range image of any shape, I.e. (rings, beams), as nested lists or an np.ndarray .
+    Every index of a range image gets its own median and the medians keep the shape.
+    The scans are stored and the medians returned in the dtype of the first scan
+    (float64 for a list), so float32 or uint16 scans stay float32 or uint16.
+    Medians of integer scans are rounded down when they fall between two integers.
+    Integer scans wider than 32 bits, like np.array([1, 2]) , are stored as float64.
 
     Parameters
     ----------
     D : float or int,
         Number of scans besides the current one that will be included during median value calculation.
+    median_mode : str, optional
+        How the medians are found (default "full").
+        "full" takes the median of the D+1 stored scans from scratch on every update.
+        "incremental" keeps the samples of every index sorted and on every update
+        only removes the oldest sample and inserts the newest one.
+        Both modes return exactly the same medians.
+        "histogram" is for quantized scans such as integer centimeters. It keeps a histogram
+        of the samples of every index and returns the exact medians of the samples
+        rounded to the nearest multiple of resolution (counting from value_range[0]).
+        The cost of an update doesn't depend on D, so it suits very long windows,
+        but it keeps a counter for every bin of every index.
+    nonfinite : str, optional
+        What to do with NaN and infinite numbers in a scan (default "pass").
+        "pass" handles them like np.median does, so a NaN makes the median of its index NaN.
+        "raise" raises a TypeError. "missing" leaves them out of the medians,
+        and an index with nothing but missing measurements gets NaN.
+    resolution : float or int, optional
+        The width of a histogram bin. Needed for the "histogram" median mode.
+    value_range : tuple, optional
+        The (lowest, highest) value the histogram covers, usually the range_min and range_max
+        of the RangeFilter run before this filter. Values outside of it are counted
+        in the first or last bin. Needed for the "histogram" median mode.
+    workers : int, optional
+        The number of threads the indexes of long scans are split between (default 1).
+        The medians are the same for any number of threads. The "histogram" median mode
+        always uses one thread.
+    max_age : float or int, optional
+        Used by update_timed. The medians are taken over the stored scans no more than
+        max_age seconds older than the newest one, at most D+1 of them.
+    dropout : float or int, optional
+        The value a sensor reports when no return came back, I.e. 0 or infinity.
+        Samples equal to dropout, and the ones left out by the mask passed to an update,
+        are invalid returns. They are left out of the medians like the missing measurements
+        of nonfinite="missing" (which then also applies to NaN), and an index without
+        a valid sample gets NaN, or dropout for integer scans. _valid_count tells
+        how many valid samples every median was taken over.
+    backend : str, optional
+        What takes the medians of the "full" median mode and update_timed (default "auto").
+        "numpy" uses np.median and np.sort, "python" a loop over the indexes and "jit"
+        the same loop compiled by numba, which has to be installed. "auto" is "numpy",
+        which is faster for most windows. All backends return exactly the same medians.
+    statistics : str or tuple of str, optional
+        What the updates take over the window of every index (default "median").
+        "median" is the median, "mean" the mean, "p" followed by a percentile (I.e. "p10")
+        a percentile interpolated like np.percentile and "trim" followed by a percentage
+        (I.e. "trim10") the mean without that percentage of the lowest and of the highest samples.
+        Missing samples are left out as they are for the medians.
+        Given several statistics the updates return the first one and all of them are
+        in _current_statistics, so they share one history. The mean is kept as running sums,
+        so it costs the same for any D. The others are read off the sorted window.
+        Integer scans get their statistics rounded down like the medians.
+    tolerance : float or int, optional
+        Turns on change-gated updates in the "full" median mode. An index keeps its cached
+        median when its new sample equals the evicted one or both are on the same side of
+        the two middle samples, which never changes the median. An index whose new sample
+        differs from the evicted one by no more than tolerance keeps it as well, for as long
+        as the changes it let through add up to no more than tolerance, so every returned
+        median is within tolerance of the exact one (tolerance 0 returns the exact medians).
+        Only the other indexes are sorted again, which saves most of the work for scans
+        that barely change, I.e. from a parked vehicle. _recomputed_fraction tells how many were.
 
     Attributes
     ----------
@@ -143,8 +1210,66 @@ class TemporalFilter:
         The most recent list of medians returned by the object's update method.
     _D : int
         Number of scans besides the current one that will be included during median value calculation.
+    _history : np.ndarray or None
+        A preallocated (D+1, N) array holding the D+1 most recent scans in the dtype
+        of the first scan. Scans are written into it in rotating order.
+        It is None until the first update. Range images are stored flattened,
+        so _history is the same memory as a (D+1, *shape) array (see _history_images).
+    _shape : tuple or None
+        The shape of the scans, I.e. (N,) or (rings, beams). None until the first update.
+    _max_age : float or int or None
+        Equal to max_age .
+    _dropout : float or int or None
+        Equal to dropout .
+    _backend : str
+        The backend in use, "python", "numpy" or "jit".
+    _statistics : tuple
+        The statistics as (name, kind, parameter) tuples, I.e. ("p10", "percentile", 10.0).
+    _statistic_values : dict
+        The flat arrays of the statistics of the most recent update by name.
+    _sums : np.ndarray or None
+        Used by the "mean" statistic. The sum of the stored samples of every index,
+        leaving out NaN, infinite and missing samples, which _sum_counts counts instead.
+    _sum_counts : np.ndarray or None
+        Used by the "mean" statistic. A (3, N) array holding the number of stored
+        NaN (or missing), positive infinite and negative infinite samples of every index.
+    _tolerance : float or int or None
+        Equal to tolerance .
+    _gate : tuple or None
+        Used with a tolerance. The cached lower and upper middle samples, medians and
+        the changes let through since the last time, of every index. None until
+        the window is full and after the stored scans are replaced.
+    _recomputed_fraction : float
+        Used with a tolerance. The fraction of the indexes whose median was taken again
+        by the most recent update.
+    _timestamps : np.ndarray or None
+        Used by update_timed. The timestamp of the scan in every row of _history.
+    _write_index : int
+        The row of _history the next scan will be written into.
+    _count : int
+        The number of scans stored in _history (at most D+1). They are the _count
+        rows in front of _write_index, going round the end of _history.
+    _median_mode : str
+        Either "full", "incremental" or "histogram".
+    _nonfinite : str
+        Equal to nonfinite .
+    _sorted : np.ndarray or None
+        Used by the "incremental" median mode. A (D+1, N) array where column n holds
+        the stored samples of index n in sorted order.
+    _resolution : float or int or None
+        Equal to resolution .
+    _value_range : tuple or None
+        Equal to value_range .
+    _histogram : _HistogramMedian or None
+        Used by the "histogram" median mode. The histograms of the stored samples.
     _recent_scans : list
         A list of the D+1 most recent scans passed to the object's update method.
+        The most recent scan comes first.
+    _valid_count : np.ndarray
+        The number of samples of every index in the current window that aren't
+        missing, in the shape of the scans.
+    _current_statistics : dict
+        The statistics of the most recent update by name, in the shape of the scans.
 
     Note
     ----------
@@ -152,13 +1277,36 @@ class TemporalFilter:
     and the _current_y_list will be equal to the most recent scan.
     If a float is passed to D then D will be rounded to the nearest int.
     """
-    def __init__(self, D: int):
+    def __init__(self, D: int, median_mode: str = "full", nonfinite: str = "pass",
+                 resolution: float = None, value_range: tuple = None, workers: int = 1,
+                 max_age: float = None, dropout: float = None, backend: str = "auto",
+                 statistics="median", tolerance: float = None):
         """Initializes a TemporalFilter object.
 
         Parameters
         ----------
         D : float or int
             Number of scans besides the current one that will be included during median value calculation.
+        median_mode : str, optional
+            Either "full", "incremental" or "histogram" (default "full").
+        nonfinite : str, optional
+            "pass", "raise" or "missing" (default "pass").
+        resolution : float or int, optional
+            The width of a histogram bin for the "histogram" median mode.
+        value_range : tuple, optional
+            The (lowest, highest) value the histogram covers for the "histogram" median mode.
+        workers : int, optional
+            The number of threads the indexes of long scans are split between (default 1).
+        max_age : float or int, optional
+            The length in seconds of the window of update_timed.
+        dropout : float or int, optional
+            The value of invalid returns, which are left out of the medians.
+        backend : str, optional
+            "auto", "python", "numpy" or "jit" (default "auto").
+        statistics : str or tuple of str, optional
+            The statistics to take, I.e. ("mean", "p10") (default "median").
+        tolerance : float or int, optional
+            How far the medians may be from the exact ones in change-gated updates.
         """
         # Make sure D is a number
         if isinstance(D, float) is False:
@@ -177,13 +1325,121 @@ class TemporalFilter:
             import time
             time.sleep(3.5)
 
+        # Make sure the median mode is one we know.
+        if median_mode not in ("full", "incremental", "histogram"):
+            raise TypeError('median_mode must be "full", "incremental" or "histogram"')
+        _check_nonfinite_policy(nonfinite)
+        _check_dropout(dropout)
+        self._set_workers(workers)
+        self._backend = _resolve_backend(backend)
+        self._statistics = _parse_statistics(statistics)
+
+        # The histogram median mode needs to know its bins.
+        if median_mode == "histogram":
+            if isinstance(resolution, (float, int)) is False or resolution <= 0:
+                raise TypeError('The "histogram" median mode needs a positive resolution')
+            if (isinstance(value_range, (tuple, list)) is False or len(value_range) != 2
+                    or value_range[0] >= value_range[1]):
+                raise TypeError('The "histogram" median mode needs a value_range (lowest, highest)')
+
+        # Change-gated updates need the "full" median mode and a tolerance of at least 0.
+        if tolerance is not None:
+            if isinstance(tolerance, (float, int)) is False or not tolerance >= 0:
+                raise TypeError("tolerance must be a float or int of at least 0")
+            if median_mode != "full":
+                raise TypeError('A tolerance only works with the "full" median mode')
+
+        # The window of update_timed has to be a positive number of seconds.
+        if max_age is not None and (isinstance(max_age, (float, int)) is False or max_age <= 0):
+            raise TypeError("max_age must be a positive number of seconds")
+
         # Create the instance's attributes.
+        # _history is allocated by the first update once the length of a scan is known.
         self._D = D
-        self._recent_scans = []
-        self._current_y_list = []
+        self._history = None
+        self._write_index = 0
+        self._count = 0
+        self._median_mode = median_mode
+        self._nonfinite = nonfinite
+        self._sorted = None
+        self._resolution = resolution
+        self._value_range = value_range
+        self._histogram = None
+        self._shape = None
+        self._max_age = max_age
+        self._dropout = dropout
+        self._timestamps = None
+        self._statistic_values = {}
+        self._sums = None
+        self._sum_counts = None
+        self._tolerance = tolerance
+        self._gate = None
+        self._recomputed_fraction = 1.0
+        self._current_y = np.empty(0)
+
+
+    @property
+    def _recent_scans(self):
+        """A list of the D+1 most recent scans, the most recent scan first."""
+        return [scan.reshape(self._shape or scan.shape).tolist() for scan in self._chronological()[::-1]]
+
+
+    @property
+    def _history_images(self):
+        """_history as a (D+1, *shape) array without copying it."""
+        if self._history is None:
+            return None
+        return self._history.reshape((self._D + 1,) + (self._shape or self._history.shape[1:]))
+
+
+    @property
+    def _current_y_list(self):
+        """The most recent medians as a list."""
+        return self._current_y.tolist()
+
+
+    @property
+    def _valid_count(self):
+        """The number of samples of every index in the window that aren't missing."""
+        if self._history is None:
+            return np.empty(0, dtype=np.intp)
+        if self._histogram is not None:
+            counts = self._count - self._histogram._missing
+        elif self._history.dtype.kind == 'f':
+            counts = np.count_nonzero(~np.isnan(self._stored()), axis=0)
+        elif self._dropout is not None:
+            counts = np.count_nonzero(self._stored() != self._dropout, axis=0)
+        else:
+            counts = np.full(self._history.shape[1], self._count, dtype=np.intp)
+        return counts.reshape(self._shape or counts.shape)
+
+
+    @property
+    def _current_statistics(self):
+        """The statistics of the most recent update by name, in the shape of the scans."""
+        if self._median_only:
+            return {self._statistics[0][0]: self._current_y}
+        return {name: values.reshape(self._shape or values.shape) for name, values in self._statistic_values.items()}
+
+
+    @property
+    def _median_only(self):
+        """Whether the median is the only statistic, as it is by default."""
+        return len(self._statistics) == 1 and self._statistics[0][1] == "median"
+
+
+    def _takes(self, kind):
+        """Returns whether one of the statistics is of the given kind."""
+        return any(statistic_kind == kind for _, statistic_kind, _ in self._statistics)
+
+
+    @property
+    def _skip_missing(self):
+        """Whether missing samples are left out of the medians."""
+        return self._nonfinite == "missing" or self._dropout is not None
 
 
-    def update(self, scan):
+    def update(self, scan, validate: bool = True, mask=None):
         """Returns a list of median values where each median value
         is the median of values for a specific index shared between the newest scan
         and D most recent scans.
@@ -196,6 +1452,12 @@ class TemporalFilter:
         Parameters
         ----------
         scan : One-dimensional array of numbers either as a list or np.ndarray .
+        validate : bool, optional
+            If False the scan is not checked (default True).
+            Only pass False for scans known to be fine.
+        mask : array of bools, optional
+            True for every sample of scan that is an invalid return, which is left
+            out of the medians. Needs a filter made with a dropout or nonfinite="missing".
 
         Returns
         ----------
@@ -206,70 +1468,1191 @@ class TemporalFilter:
         ----------
         The length of scan must be equal to the length of the previous scan.
         """
-        # Check to see if the scan passed to update is a numpy array.
-        # If it is we will convert it to a list.
-        if isinstance(scan, np.ndarray):
-            scan = scan.tolist()
+        return self.update_array(scan, validate=validate, mask=mask).tolist()
+
+
+    def update_array(self, scan, out=None, validate: bool = True, mask=None):
+        """Same as update but returns the medians as an np.ndarray .
+
+        Parameters
+        ----------
+        scan : One-dimensional array of numbers either as a list or np.ndarray .
+        out : np.ndarray, optional
+            An array of length N the medians are written into.
+        validate : bool, optional
+            If False the scan is not checked (default True).
+        mask : array of bools, optional
+            True for every sample of scan that is an invalid return (see update).
+
+        Returns
+        ----------
+        medians : np.ndarray
+            The most recent medians (out if out was passed).
+        """
+        # Check the scan and turn it into an np.ndarray .
+        scan = _as_scan_array(scan, validate)
+        return self._filter(scan, out, mask)
+
+
+    def _filter(self, scan, out=None, mask=None):
+        """Stores scan, an np.ndarray that has already been checked, and returns the medians."""
+        medians = self._flat_call(self._measured_filter, self._mark_missing(scan, mask), out, 0)
+        if scan.ndim > 1:
+            self._current_y = medians
+        return medians
+
+
+    def _flat_call(self, method, scans, out, leading):
+        """Calls method(scans, out) with every scan flattened and returns its result
+        in the shape of scans. The first leading axes of scans aren't part of a scan.
+        Contiguous scans and out arrays are flattened without copying them."""
+        shape = scans.shape[leading:]
+        self._check_shape(shape)
+        if len(shape) == 1:
+            return method(scans, out)
+
+        flat_shape = scans.shape[:leading] + (int(np.prod(shape)),)
+        flat_out = None
+        if out is not None and out.flags.c_contiguous:
+            flat_out = out.reshape(flat_shape)
+        result = method(scans.reshape(flat_shape), flat_out).reshape(scans.shape)
+        if out is None:
+            return result
+        if flat_out is None:
+            out[...] = result
+        return out
+
+
+    def _check_shape(self, shape):
+        """Remembers the shape of the first scan and checks the shape of every later one."""
+        if self._history is None or self._shape is None:
+            self._shape = shape
+            return
+
+        # Scans of different lengths are caught by _allocate.
+        if shape != self._shape and (len(shape) > 1 or len(self._shape) > 1):
+            raise TypeError('The shape of the current scan must be the same as '
+                            'the shape of the previous scan. \n Make a new '
+                            'TemporalFilter object if you wish to start '
+                            'filtering scans of a new shape.')
+
+
+    def _mark_missing(self, scans, mask=None):
+        """Applies the nonfinite policy to scans and marks their invalid returns (see dropout)
+        as missing, NaN for float scans and dropout for integer ones."""
+        if mask is not None and self._skip_missing is False:
+            raise TypeError('A mask can only be used by a filter made with a dropout or nonfinite="missing".')
+
+        # Integer dropouts already are the marker. Scans stored as floats use NaN, whatever their dtype.
+        if self._stored_dtype(scans.dtype).kind != 'f':
+            if mask is None:
+                return scans
+            invalid = _invalid_returns(scans, self._dropout, mask)
+            if invalid is None:
+                return scans
+            scans = scans.copy()
+            scans[invalid] = self._dropout
+            return scans
+
+        invalid = _invalid_returns(scans, self._dropout, mask)
+        scans = _apply_nonfinite(scans, self._nonfinite, invalid)
+        if invalid is None:
+            return scans
+        return np.where(invalid, np.nan, scans)
+
+
+    def _measured_filter(self, scan, out=None):
+        """Stores scan, a one-dimensional np.ndarray , and returns the medians."""
+        if self._stats is None:
+            return self._window_filter(scan, out)
+
+        start = time.perf_counter()
+        medians = self._window_filter(scan, out)
+        self._stats.record(time.perf_counter() - start, 1, state=self._window_state())
+        return medians
+
+
+    def _window_state(self):
+        """Returns how full the window of scans is, for FilterStats."""
+        state = {"window_scans": self._count, "window_fill": self._count / (self._D + 1)}
+        if self._tolerance is not None:
+            state["recomputed_fraction"] = self._recomputed_fraction
+        return state
+
+
+    def _window_filter(self, scan, out=None):
+        """Stores scan and returns the first of the statistics."""
+        if self._median_only:
+            return self._median_filter(scan, out)
 
-        # Check to see if the scan is a list.
-        if isinstance(scan, list) is False:
-            raise TypeError("TemporalFilter's update method takes a list of numbers as its argument.")
+        # The median modes store the scan themselves.
+        medians = None
+        if self._takes("median"):
+            medians = self._median_filter(scan, out if self._statistics[0][1] == "median" else None)
+        else:
+            self._push(scan)
+        return self._window_statistics(medians, out)
 
-        # If self._recent_scans isn't empty check to see if the length of the current scan
-        # matches the length of the previous scan. If the lengths don't match raise the TypeError.
-        if self._recent_scans:
-            if len(scan) != len(self._recent_scans[0]):
+
+    def _window_statistics(self, medians=None, out=None):
+        """Takes the statistics of the stored scans, keeps them in _statistic_values
+        and returns the first one. medians are the medians if already known."""
+        values = {}
+        window = None
+        for name, kind, parameter in self._statistics:
+            target = out if name == self._statistics[0][0] else None
+            if kind == "median":
+                values[name] = self._median(self._stored(), target) if medians is None else medians
+            elif kind == "mean":
+                values[name] = self._in_history_dtype(self._mean(), target)
+            else:
+                # The percentiles and trimmed means share one sorted window.
+                if window is None:
+                    window = self._sorted_window()
+                dropout = None if window.dtype.kind == 'f' else self._dropout
+                if kind == "percentile":
+                    result = _percentile_of_sorted(window, parameter, self._skip_missing, dropout)
+                else:
+                    result = _trimmed_mean_of_sorted(window, parameter, self._skip_missing, dropout)
+                values[name] = self._in_history_dtype(result, target)
+
+        self._statistic_values = values
+        self._current_y = values[self._statistics[0][0]]
+        return self._current_y
+
+
+    def _sorted_window(self):
+        """Returns the stored samples of every index in sorted order."""
+        # The incremental median mode keeps them sorted while there is a median to take.
+        if self._median_mode == "incremental" and self._takes("median"):
+            return self._sorted[:self._count]
+        return np.sort(self._stored(), axis=0)
+
+
+    def _mean(self):
+        """Returns the means of the stored samples as float64 from the running sums,
+        with NaN and infinity where np.mean would give them."""
+        nans, positive, negative = self._sum_counts
+        valid = self._count - nans if self._skip_missing else np.full(len(nans), self._count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = self._sums / valid
+        means[positive > 0] = np.inf
+        means[negative > 0] = -np.inf
+        means[(positive > 0) & (negative > 0)] = np.nan
+        if self._skip_missing is False:
+            means[nans > 0] = np.nan
+        means[valid == 0] = np.nan
+        return means
+
+
+    def _sum_scan(self, scan, step):
+        """Adds (step 1) or removes (step -1) scan from the running sums of the "mean" statistic."""
+        if self._sums.dtype.kind == 'f':
+            finite = np.isfinite(scan)
+            self._sums += step * np.where(finite, scan, 0)
+            if not finite.all():
+                self._sum_counts[0] += step * np.isnan(scan)
+                self._sum_counts[1] += step * (scan == np.inf)
+                self._sum_counts[2] += step * (scan == -np.inf)
+            return
+
+        # Integer samples are summed exactly. Only dropouts are missing.
+        if self._dropout is None:
+            self._sums += step * scan.astype(np.int64)
+            return
+        missing = scan == self._dropout
+        self._sums += step * np.where(missing, 0, scan).astype(np.int64)
+        self._sum_counts[0] += step * missing
+
+
+    def _reset_sums(self):
+        """Sums the stored scans from scratch for the "mean" statistic."""
+        length = self._history.shape[1]
+        self._sums = np.zeros(length, dtype=np.float64 if self._history.dtype.kind == 'f' else np.int64)
+        self._sum_counts = np.zeros((3, length), dtype=np.intp)
+        for scan in self._stored():
+            self._sum_scan(scan, 1)
+
+
+    def _in_history_dtype(self, values, out=None):
+        """Returns float64 values such as means in the dtype of the stored scans.
+        For integer scans they are rounded down and NaN becomes dropout."""
+        if self._history.dtype.kind in 'iu':
+            np.floor(values, out=values)
+            # An index without a valid sample gets dropout.
+            if self._dropout is not None:
+                values[np.isnan(values)] = self._dropout
+        if out is None:
+            return values.astype(self._history.dtype)
+        out[...] = values
+        return out
+
+
+    def _median_filter(self, scan, out=None):
+        """Stores scan and returns the medians."""
+        if self._median_mode == "incremental":
+            self._current_y = self._incremental_median(scan, out)
+            return self._current_y
+        if self._median_mode == "histogram":
+            self._current_y = self._histogram_median(scan, out)
+            return self._current_y
+
+        # With a tolerance only the indexes whose median may change are done again.
+        if self._tolerance is not None:
+            # Check the scan before it's compared with the stored ones.
+            self._allocate(len(scan), scan.dtype)
+            changed = self._changed_indexes(scan)
+            self._push(scan)
+            self._current_y = self._gated_median(self._stored(), changed, out)
+            return self._current_y
+
+        # Store the scan in the history and take the median of every index at once.
+        self._push(scan)
+        samples = self._stored()
+        if self._workers == 1:
+            self._current_y = self._median(samples, out)
+            return self._current_y
+
+        if out is None:
+            out = np.empty(samples.shape[1], dtype=samples.dtype)
+        self._in_chunks(len(out), lambda start, stop: self._median(samples[:, start:stop], out[start:stop]))
+        self._current_y = out
+        return self._current_y
+
+
+    def _changed_indexes(self, scan):
+        """Returns the indexes whose median may change when scan replaces the oldest stored
+        scan, or None for all of them, and adds up the changes let through for the others."""
+        if self._gate is None or self._count < self._D + 1:
+            return None
+        low, high, _, drift = self._gate
+        new = scan.astype(self._history.dtype, copy=False)
+        evicted = self._history[self._write_index]
+        if new.dtype.kind != 'f':
+            new, evicted = new.astype(np.float64), evicted.astype(np.float64)
+
+        # Replacing a sample by one on the same side of both middle samples leaves them as
+        # they are. The cached middle samples may be off by as much as the changes let through.
+        # inf and NaN samples give NaN changes, which are never let through.
+        with np.errstate(invalid="ignore"):
+            unchanged = ((new == evicted) | ((new > high + drift) & (evicted > high + drift))
+                         | ((new < low - drift) & (evicted < low - drift)))
+            change = np.abs(new - evicted)
+            nudged = ~unchanged & (drift + change <= self._tolerance)
+
+        # Integer dropouts change the number of valid samples.
+        if self._history.dtype.kind != 'f' and self._dropout is not None:
+            missing = (new == self._dropout) | (evicted == self._dropout)
+            unchanged &= ~missing
+            nudged &= ~missing
+
+        drift[nudged] += change[nudged]
+        return np.flatnonzero(~(unchanged | nudged))
+
+
+    def _gated_median(self, samples, changed, out=None):
+        """Returns the medians of samples, taking only the ones of the indexes in changed
+        (all of them if None) again and the cached ones for the rest."""
+        length = samples.shape[1]
+        if changed is None:
+            low, high, medians = self._middles(samples)
+            self._gate = (low, high, medians, np.zeros(length))
+            self._recomputed_fraction = 1.0
+        else:
+            low, high, medians, drift = self._gate
+            if len(changed):
+                low[changed], high[changed], medians[changed] = self._middles(samples[:, changed])
+                drift[changed] = 0
+            self._recomputed_fraction = len(changed) / length
+
+        # The cached medians are kept, so the caller gets a copy.
+        if out is None:
+            return medians.copy()
+        out[...] = medians
+        return out
+
+
+    def _middles(self, samples):
+        """Returns the lower and upper middle sample of every column of samples and
+        the medians made of them, which are the ones _median returns."""
+        window = np.sort(samples, axis=0)
+        dropout = None if window.dtype.kind == 'f' else self._dropout
+        if self._skip_missing and (window.dtype.kind == 'f' or dropout is not None):
+            _, skipped, in_front = _missing_run(window, dropout)
+        else:
+            skipped, in_front = np.zeros(window.shape[1], dtype=np.intp), len(window)
+        valid = len(window) - skipped
+
+        low, high = _take_ranks(window, np.stack([(valid - 1) // 2, valid // 2]), skipped, in_front)
+        if window.dtype.kind in 'iu':
+            return low, high, _mean_rounded_down(low, high)
+        with np.errstate(invalid="ignore"):
+            medians = np.where(valid % 2 == 1, high, (low + high) / 2)
+        medians[valid == 0] = np.nan
+        if self._skip_missing is False:
+            medians[np.isnan(window[-1])] = np.nan
+        return low, high, medians
+
+
+    def _median(self, samples, out=None):
+        """Returns the median of every column of samples, leaving out missing
+        measurements if the nonfinite policy is "missing" or there is a dropout."""
+        if self._backend != "numpy":
+            return self._kernel_median(samples, out)
+
+        # np.median would turn integer samples into float64.
+        if self._skip_missing or samples.dtype.kind != 'f':
+            return self._median_of_window(np.sort(samples, axis=0), len(samples), out)
+        # -inf and inf in the middle give NaN without a warning, like the other backends.
+        with np.errstate(invalid="ignore"):
+            return np.median(samples, axis=0, out=out)
+
+
+    def _kernel_median(self, samples, out=None):
+        """Returns the same medians as _median with the kernel of the "python" or "jit" backend."""
+        kernel = _python_median
+        if self._backend == "jit":
+            # A filter unpickled in another process may be the first to use it there.
+            _load_jit()
+            kernel = _jit_median
+        if out is None:
+            out = np.empty(samples.shape[1], dtype=samples.dtype)
+
+        # Float scans mark missing samples with NaN and integer scans with dropout.
+        integer = samples.dtype.kind != 'f'
+        use_dropout = integer and self._dropout is not None
+        dropout = samples.dtype.type(self._dropout if use_dropout else 0)
+        empty = dropout if integer else samples.dtype.type(np.nan)
+
+        # The compiled kernel doesn't check its indexes, so an empty scan never gets to it.
+        # The callers split long scans between threads.
+        # -inf and inf in the middle give NaN without a warning, like np.median.
+        if samples.shape[1]:
+            with np.errstate(invalid="ignore"):
+                kernel(samples, integer, self._skip_missing, use_dropout, dropout, empty, out)
+        return out
+
+
+    def _median_of_window(self, window, count, out=None):
+        """Returns the median of every column of window, which holds count sorted samples."""
+        if self._skip_missing and window.dtype.kind == 'f':
+            return _median_of_valid(window[:count], out)
+        if self._dropout is not None:
+            return _median_of_valid(window[:count], out, self._dropout)
+        return _median_of_sorted(window, count, out)
+
+
+    def _incremental_median(self, scan, out=None):
+        """Stores scan and returns the medians by updating the sorted samples in _sorted."""
+        # Once D+1 scans are stored the scan about to be overwritten drops out of every window.
+        evicted = None
+        if self._count == self._D + 1:
+            evicted = self._history[self._write_index].copy()
+        self._push(scan)
+
+        # Swap the evicted sample of every index for the new one without re-sorting.
+        if self._sorted is None:
+            self._sorted = np.empty_like(self._history)
+        count = self._count - 1 if evicted is None else self._count
+        new = self._history[self._write_index - 1]
+        if self._workers == 1:
+            _replace_sorted(self._sorted, count, new, evicted)
+            return self._median_of_window(self._sorted, self._count, out)
+
+        if out is None:
+            out = np.empty(len(new), dtype=self._history.dtype)
+
+        def replace(start, stop):
+            window = self._sorted[:, start:stop]
+            _replace_sorted(window, count, new[start:stop], None if evicted is None else evicted[start:stop])
+            self._median_of_window(window, self._count, out[start:stop])
+
+        self._in_chunks(len(new), replace)
+        return out
+
+
+    def _histogram_median(self, scan, out=None):
+        """Stores scan and returns the medians by updating the histograms in _histogram."""
+        evicted = None
+        if self._count == self._D + 1:
+            evicted = self._history[self._write_index].copy()
+        self._push(scan)
+
+        # Move the evicted sample of every index out of its histogram and the new one in.
+        if self._histogram is None:
+            self._histogram = _HistogramMedian(len(scan), self._D, self._resolution, self._value_range,
+                                               self._dropout)
+        if evicted is not None:
+            self._histogram.add(evicted, -1)
+        self._histogram.add(self._history[self._write_index - 1], 1)
+        return self._histogram_result(out)
+
+
+    def _histogram_result(self, out=None):
+        """Returns the medians of the histograms in the dtype of the stored scans."""
+        return self._in_history_dtype(self._histogram.medians(self._count, self._skip_missing), out)
+
+
+    def update_batch(self, scans, out=None, validate: bool = True, mask=None):
+        """Updates the filter with T consecutive scans at once and returns
+        the medians after every one of them.
+
+        The result is exactly the same as calling update_array on each scan in turn,
+        including the first D rows of a new filter where fewer than D+1 scans exist.
+        Scans stored by earlier updates are taken into account, and afterwards the filter
+        holds the D+1 most recent scans just as if update had been called T times.
+
+        Parameters
+        ----------
+        scans : A (T, N) np.ndarray or a list of T scans of length N.
+            Range images can be given as a (T, *shape) np.ndarray .
+        out : np.ndarray, optional
+            A (T, N) array the medians are written into.
+        validate : bool, optional
+            If False the scans are not checked (default True).
+        mask : array of bools, optional
+            A mask of the invalid returns in scans, in the shape of scans (see update).
+
+        Returns
+        ----------
+        medians : np.ndarray
+            A (T, N) array where row t holds the medians after scans[t].
+        """
+        scans = self._mark_missing(_as_scan_stack(scans, validate), mask)
+        medians = self._flat_call(self._batch, scans, out, 1)
+        if scans.ndim > 2 and len(medians):
+            self._current_y = medians[-1]
+        return medians
+
+
+    def _batch(self, scans, out=None):
+        """update_batch for a (T, N) np.ndarray of checked scans."""
+        if self._median_mode == "histogram" or self._median_only is False:
+            return self._sequential_batch(scans, out)
+        if len(scans) == 0:
+            return np.empty((0,) + scans.shape[1:], dtype=self._stored_dtype(scans.dtype)) if out is None else out
+        if self._stats is not None:
+            started = time.perf_counter()
+        self._allocate(scans.shape[1], scans.dtype)
+
+        # Put the stored scans in front of the new ones so every window is a run of rows.
+        stored = self._chronological()
+        stack = np.concatenate([stored, scans.astype(self._history.dtype, copy=False)])
+        if out is None:
+            out = np.empty(scans.shape, dtype=self._history.dtype)
+
+        # Rows that come before D+1 scans have been seen take the median of all scans so far.
+        window = self._D + 1
+        warm_up = min(len(scans), max(0, window - 1 - len(stored)))
+        for t in range(warm_up):
+            self._median(stack[:len(stored) + t + 1], out[t])
+
+        # Every other row is the median of a window of D+1 consecutive rows.
+        # A few rows at a time the samples are turned so the ones of each index sit next
+        # to each other, the strided windows over them are sorted (which is much faster
+        # than np.median on the same windows) and the middle samples are read off.
+        offset = len(stored) + 1 - window
+        step = max(1, _BATCH_ELEMENTS // max(1, window * scans.shape[1]))
+        for start in range(warm_up, len(scans), step):
+            stop = min(start + step, len(scans))
+            samples = np.ascontiguousarray(stack[offset + start:offset + stop + window - 1].T)
+            medians = out[start:stop].T
+
+            def sort_windows(first, last):
+                windows = np.sort(np.lib.stride_tricks.sliding_window_view(samples[first:last], window, axis=1),
+                                  axis=-1)
+                self._median_of_window(np.moveaxis(windows, -1, 0), window, medians[first:last])
+
+            self._in_chunks(len(samples), sort_windows)
+
+        # Keep the D+1 most recent scans for the next update.
+        self._set_history(stack[-window:])
+        self._current_y = out[-1]
+
+        if self._stats is not None:
+            self._stats.record(time.perf_counter() - started, len(scans), state=self._window_state())
+        return out
+
+
+    def _sequential_batch(self, scans, out=None):
+        """update_batch for filters that take one scan at a time, like the "histogram"
+        median mode that updates its histograms scan by scan."""
+        if self._stats is not None:
+            started = time.perf_counter()
+        if len(scans):
+            self._allocate(scans.shape[1], scans.dtype)
+        if out is None:
+            out = np.empty(scans.shape, dtype=self._stored_dtype(scans.dtype))
+        for t in range(len(scans)):
+            self._window_filter(scans[t], out[t])
+        if len(scans):
+            self._current_y = out[-1]
+
+        if self._stats is not None:
+            self._stats.record(time.perf_counter() - started, len(scans), state=self._window_state())
+        return out
+
+
+    def save_state(self, path):
+        """Saves the stored scans to a file so a new TemporalFilter can carry on
+        with a full window after a restart (see load_state).
+
+        The file is a scan log (see scanlog.py) holding the stored scans,
+        the oldest scan first, in the dtype they are stored in. A filter updated
+        with update_timed saves the timestamps of the scans as well.
+
+        Parameters
+        ----------
+        path : str
+            The file to write. An existing file is overwritten.
+        """
+        scans = self._chronological()
+        dtype = np.float64 if self._history is None else self._history.dtype
+        timestamps = None if self._timestamps is None else self._timestamps[self._rows()]
+        with scanlog.ScanLogWriter(path, scans.shape[1], dtype, timestamps is not None) as writer:
+            if len(scans):
+                writer.append_batch(scans, timestamps)
+
+
+    def load_state(self, path):
+        """Replaces the stored scans with the ones saved by save_state, so the next update
+        returns the same medians it would have returned in the filter that saved them.
+
+        The file is memory-mapped and only the D+1 most recent scans in it are read.
+        The filter must have the same D (or a smaller one) for the medians to match.
+        Timestamps in the file are restored too, so update_timed carries on with them.
+
+        Parameters
+        ----------
+        path : str
+            A file written by save_state (or any scan log).
+        """
+        with scanlog.ScanLogReader(path) as reader:
+            if len(reader):
+                self._set_history(reader.scans)
+
+                # _set_history puts the scans in the first rows of _history, oldest first.
+                if reader.timestamps is not None:
+                    self._timestamps = np.full(self._D + 1, -np.inf)
+                    self._timestamps[:self._count] = reader.timestamps[-self._count:]
+        self._current_y = np.empty(0)
+
+
+    def update_timed(self, scan, timestamp: float, out=None, validate: bool = True, mask=None):
+        """Same as update_array but the medians are taken over the stored scans
+        no more than max_age seconds older than scan, instead of the D+1 most recent ones.
+
+        Older scans are dropped from the history. At most D+1 scans are stored,
+        so if more than D+1 scans arrive within max_age seconds only the D+1 most
+        recent of them are used. Only the "full" median mode can do this, and a filter
+        should be updated either with update_timed or without timestamps, not both.
+
+        Parameters
+        ----------
+        scan : One-dimensional array of numbers either as a list or np.ndarray .
+        timestamp : float or int
+            The time of the scan in seconds. Timestamps must not go backwards.
+        out : np.ndarray, optional
+            An array of length N the medians are written into.
+        validate : bool, optional
+            If False the scan is not checked (default True).
+        mask : array of bools, optional
+            True for every sample of scan that is an invalid return (see update).
+
+        Returns
+        ----------
+        medians : np.ndarray
+            The medians (out if out was passed).
+        """
+        if self._max_age is None:
+            raise TypeError("update_timed needs a TemporalFilter made with a max_age")
+        if self._median_mode != "full":
+            raise TypeError('update_timed only works with the "full" median mode')
+
+        scan = self._mark_missing(_as_scan_array(scan, validate), mask)
+        medians = self._flat_call(lambda flat_scan, flat_out: self._timed_filter(flat_scan, timestamp, flat_out),
+                                  scan, out, 0)
+        if scan.ndim > 1:
+            self._current_y = medians
+        return medians
+
+
+    def _timed_filter(self, scan, timestamp, out=None):
+        """Stores scan with its timestamp, drops the scans older than max_age and returns the medians."""
+        if self._stats is not None:
+            started = time.perf_counter()
+
+        # Scans stored without a timestamp count as expired.
+        if self._timestamps is None:
+            self._timestamps = np.full(self._D + 1, -np.inf)
+        if self._count and timestamp < self._timestamps[self._write_index - 1]:
+            raise TypeError("The timestamps passed to update_timed must not go backwards.")
+
+        self._push(scan)
+        self._timestamps[self._write_index - 1] = timestamp
+
+        # The expired scans are the oldest ones, so dropping them only shrinks _count.
+        times = self._timestamps[self._rows()]
+        expired = int(np.searchsorted(times, timestamp - self._max_age, side="left"))
+        if self._sums is not None:
+            for row in self._rows()[:expired]:
+                self._sum_scan(self._history[row], -1)
+        self._count -= expired
+
+        # The scans dropped from the window would throw the cached medians of a tolerance off.
+        self._gate = None
+        if self._median_only:
+            self._current_y = self._median(self._stored(), out)
+        else:
+            self._window_statistics(None, out)
+        if self._stats is not None:
+            self._stats.record(time.perf_counter() - started, 1, state=self._window_state())
+        return self._current_y
+
+
+    def _rows(self):
+        """Returns the rows of _history holding the stored scans, the oldest scan first."""
+        return (self._write_index - self._count + np.arange(self._count)) % (self._D + 1)
+
+
+    def _stored(self):
+        """Returns the stored scans in no particular order, as a view of _history
+        unless they go round its end."""
+        start = (self._write_index - self._count) % (self._D + 1)
+        if start + self._count <= self._D + 1:
+            return self._history[start:start + self._count]
+        return self._history[self._rows()]
+
+
+    def _chronological(self):
+        """Returns the stored scans as a (_count, N) np.ndarray, the oldest scan first."""
+        if self._history is None:
+            return np.empty((0, 0))
+        start = (self._write_index - self._count) % (self._D + 1)
+        if start + self._count <= self._D + 1:
+            return self._history[start:start + self._count]
+        return np.concatenate([self._history[start:], self._history[:self._write_index]])
+
+
+    def _set_history(self, scans):
+        """Replaces the stored scans with scans, a (T, N) np.ndarray with the oldest scan first.
+        Only the last D+1 scans are kept."""
+        scans = scans[-(self._D + 1):]
+        self._allocate(scans.shape[1], scans.dtype)
+        self._history[:len(scans)] = scans
+        self._count = len(scans)
+        self._write_index = self._count % (self._D + 1)
+        self._timestamps = None
+        self._gate = None
+
+        # The incremental median mode sorts the stored samples from scratch once.
+        if self._median_mode == "incremental":
+            if self._sorted is None:
+                self._sorted = np.empty_like(self._history)
+            self._sorted[:self._count] = np.sort(self._history[:self._count], axis=0)
+
+        # The histogram median mode counts them from scratch.
+        if self._median_mode == "histogram":
+            self._histogram = _HistogramMedian(self._history.shape[1], self._D,
+                                               self._resolution, self._value_range, self._dropout)
+            for scan in self._history[:self._count]:
+                self._histogram.add(scan, 1)
+
+        # The running sums of the "mean" statistic are summed from scratch too.
+        if self._takes("mean"):
+            self._reset_sums()
+
+
+    def _allocate(self, length, dtype):
+        """Allocates _history for scans of the given length and dtype and checks
+        that the length and dtype match the scans stored so far."""
+        # The first scan decides N and the dtype, so this is where _history gets allocated.
+        if self._history is None:
+            self._history = np.empty((self._D + 1, length), dtype=_stored_dtype(dtype))
+
+        # Scans are stored in the dtype of the first scan. Float scans can't be
+        # stored in an integer history without losing their fractions.
+        if np.can_cast(dtype, self._history.dtype, "same_kind") is False:
+            raise TypeError('A scan of dtype {} can\'t be stored with scans of dtype {}. '
+                            'Make a new TemporalFilter object if you wish to start '
+                            'filtering scans of a new dtype.'.format(np.dtype(dtype), self._history.dtype))
+
+        # Check to see if the length of the current scan matches
+        # the length of the previous scans. If the lengths don't match raise the TypeError.
+        if length != self._history.shape[1]:
+            raise TypeError('The length of the current scan must be the same as '
+                            'the length of the previous scan. \n Make a new '
+                            'TemporalFilter object if you wish to start '
+                            'filtering scans of a new length.')
+
+
+    def _stored_dtype(self, dtype):
+        """Returns the dtype scans of dtype are stored in, the one of _history once it exists."""
+        return _stored_dtype(dtype) if self._history is None else self._history.dtype
+
+
+    def _push(self, scan):
+        """Writes scan into the row of _history holding the oldest scan."""
+        self._allocate(len(scan), scan.dtype)
+
+        # The running sums of the "mean" statistic lose the evicted scan.
+        if self._sums is None and self._takes("mean"):
+            self._reset_sums()
+        if self._sums is not None and self._count == self._D + 1:
+            self._sum_scan(self._history[self._write_index], -1)
+
+        # Overwrite the oldest scan (or a free row) and move the write index on to the next row.
+        # The stored scans are always the _count rows in front of the write index.
+        self._history[self._write_index] = scan
+        self._write_index = (self._write_index + 1) % (self._D + 1)
+        self._count = min(self._count + 1, self._D + 1)
+
+        # Float sums are summed from scratch once per round of the ring so rounding errors
+        # don't pile up, which still costs the same per scan for any D.
+        if self._sums is not None:
+            if self._write_index == 0 and self._sums.dtype.kind == 'f':
+                self._reset_sums()
+            else:
+                self._sum_scan(self._history[self._write_index - 1], 1)
+
+
+class SpatioTemporalFilter(TemporalFilter):
+    """A class used to find the median of the values of every index over a neighbourhood
+    of adjacent indexes in the newest scan and D most recent scans.
+    I.e. median[i] = median(scanT[i-r], ..., scanT[i+r], ..., scanT-D[i-r], ..., scanT-D[i+r])
+    where r is the radius. A spike in a single beam that lasts several scans is removed
+    as long as it covers less than half of the neighbourhood.
+
+    It stores its scans like a TemporalFilter and takes the same kinds of scans.
+    For a range image of shape (rings, beams) the neighbourhood runs along the beams of each ring.
+
+    Parameters
+    ----------
+    D : float or int
+        Number of scans besides the current one that will be included during median value calculation.
+    radius : int, optional
+        Number of indexes on each side of an index included in its neighbourhood (default 1).
+    wrap : bool, optional
+        Whether the first and last index are neighbours, as in a 360 degree scan (default True).
+        Without wrap the neighbourhoods of the indexes near the ends are cut short.
+        With wrap a radius above (beams - 1) // 2 is cut down to it, so no beam is in
+        a neighbourhood twice.
+    nonfinite : str, optional
+        "pass", "raise" or "missing" (default "pass"), as for TemporalFilter.
+    workers : int, optional
+        The number of threads the indexes of long scans are split between (default 1).
+    dropout : float or int, optional
+        The value of invalid returns, which are left out of the neighbourhoods, as for TemporalFilter.
+    backend : str, optional
+        "auto", "python", "numpy" or "jit" (default "auto"), as for TemporalFilter.
+
+    Attributes
+    ----------
+    _radius : int
+        Equal to radius .
+    _wrap : bool
+        Equal to wrap .
+    """
+    def __init__(self, D: int, radius: int = 1, wrap: bool = True, nonfinite: str = "pass", workers: int = 1,
+                 dropout: float = None, backend: str = "auto"):
+        """Initializes a SpatioTemporalFilter object.
+
+        Parameters
+        ----------
+        D : float or int
+            Number of scans besides the current one that will be included during median value calculation.
+        radius : int, optional
+            Number of indexes on each side of an index included in its neighbourhood (default 1).
+        wrap : bool, optional
+            Whether the first and last index are neighbours (default True).
+        nonfinite : str, optional
+            "pass", "raise" or "missing" (default "pass").
+        workers : int, optional
+            The number of threads the indexes of long scans are split between (default 1).
+        dropout : float or int, optional
+            The value of invalid returns, which are left out of the medians.
+        backend : str, optional
+            "auto", "python", "numpy" or "jit" (default "auto").
+        """
+        if isinstance(radius, int) is False or radius < 0:
+            raise TypeError("radius must be an int of at least 0")
+        super().__init__(D, nonfinite=nonfinite, workers=workers, dropout=dropout, backend=backend)
+        self._radius = radius
+        self._wrap = bool(wrap)
+
+
+    def _median_filter(self, scan, out=None):
+        """Stores scan and returns the medians over the neighbourhoods."""
+        self._push(scan)
+        self._current_y = self._neighbourhood_median(self._stored(), out)
+        return self._current_y
+
+
+    def _batch(self, scans, out=None):
+        """update_batch, one scan at a time."""
+        return self._sequential_batch(scans, out)
+
+
+    def _neighbourhood_median(self, samples, out=None):
+        """Returns the median of every index over its neighbourhood in samples, a (K, N) array."""
+        # Range images are handled ring by ring.
+        shape = self._shape if self._shape is not None and len(self._shape) > 1 else samples.shape[1:]
+        beams = shape[-1]
+        if beams == 0:
+            return np.empty(0, dtype=samples.dtype) if out is None else out
+        samples = samples.reshape(len(samples), -1, beams)
+        if out is None:
+            out = np.empty(samples.shape[1] * beams, dtype=samples.dtype)
+        medians = out.reshape(-1, beams)
+
+        # With wrap the beams from the other end are put around the scan so every index
+        # has a full neighbourhood. Without it the indexes near the ends are done on their own.
+        # A neighbourhood that wraps never holds a beam twice, so its radius is capped.
+        r = self._radius
+        if self._wrap:
+            r = min(r, (beams - 1) // 2)
+            padded = np.take(samples, np.arange(-r, beams + r) % beams, axis=-1)
+            inside = slice(0, beams)
+        else:
+            padded = samples
+            inside = slice(min(r, beams), max(beams - r, min(r, beams)))
+            for n in list(range(inside.start)) + list(range(inside.stop, beams)):
+                block = samples[:, :, max(0, n - r):n + r + 1]
+                self._median(np.moveaxis(block, 1, -1).reshape(-1, block.shape[1]), medians[:, n])
+
+        # Strided views put the K * (2r+1) samples of every neighbourhood side by side,
+        # which are sorted and the middle ones read off, as in update_batch.
+        if padded.shape[-1] >= 2 * r + 1:
+            windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * r + 1, axis=-1)
+            windows = np.moveaxis(windows, 0, 2).reshape(-1, len(samples) * (2 * r + 1))
+            inner = np.empty(len(windows), dtype=medians.dtype)
+
+            def sort_neighbourhoods(start, stop):
+                if self._backend != "numpy":
+                    self._kernel_median(windows[start:stop].T, inner[start:stop])
+                    return
+                neighbourhoods = np.sort(windows[start:stop], axis=-1).T
+                self._median_of_window(neighbourhoods, len(neighbourhoods), inner[start:stop])
+
+            self._in_chunks(len(windows), sort_neighbourhoods)
+            medians[:, inside] = inner.reshape(len(medians), -1)
+        return out
+
+
+class FilterPipeline:
+    """A class used to run a scan through several filters, one after the other,
+    with a single call to update. I.e. FilterPipeline(RangeFilter(), TemporalFilter(3))
+    clamps every scan and then takes the medians of the clamped scans.
+
+    The scan is checked once when it enters the pipeline and is then passed
+    from filter to filter as an np.ndarray . The output of every filter is written
+    into an array owned by the pipeline that is reused by the next update,
+    so no new arrays are made once the first scan has gone through.
+
+    Parameters
+    ----------
+    *filters : RangeFilter or TemporalFilter
+        The filters in the order the scan goes through them.
+
+    Attributes
+    ----------
+    _filters : list
+        The filters of the pipeline.
+    _buffers : list
+        The arrays the output of each filter is written into. None until the first update.
+    """
+    def __init__(self, *filters):
+        """Initializes a FilterPipeline object.
+
+        Parameters
+        ----------
+        *filters : RangeFilter or TemporalFilter
+            The filters in the order the scan goes through them.
+        """
+        # Make sure every filter can take an already checked np.ndarray .
+        for stage in filters:
+            if hasattr(stage, '_filter') is False:
+                raise TypeError("FilterPipeline takes RangeFilter and TemporalFilter objects as arguments.")
+
+        self._filters = list(filters)
+        self._buffers = [None] * len(filters)
+
+
+    def update(self, scan, out=None, validate: bool = True, mask=None):
+        """Runs scan through every filter of the pipeline and returns the result.
+
+        Parameters
+        ----------
+        scan : One-dimensional array of numbers either as a list or np.ndarray .
+        out : np.ndarray, optional
+            An array the output of the last filter is written into.
+        validate : bool, optional
+            If False the scan is not checked (default True).
+        mask : array of bools, optional
+            The invalid returns of scan, passed to the first filter. It marks them with its
+            dropout (or NaN) so later filters with the same dropout leave them out too.
+
+        Returns
+        ----------
+        filtered_scan : np.ndarray
+            The filtered scan. Unless out was passed this is an array owned by
+            the pipeline which is overwritten by the next update, so copy it
+            if it needs to be kept.
+        """
+        # Check the scan once for the whole pipeline.
+        scan = _as_scan_array(scan, validate)
+
+        for i, stage in enumerate(self._filters):
+            # The last filter writes into out when one was passed.
+            buffer = out if out is not None and i == len(self._filters) - 1 else self._buffers[i]
+
+            # A scan of a different length can't reuse the old buffer.
+            if buffer is not None and buffer.shape != scan.shape:
+                buffer = None
+
+            scan = stage._filter(scan, buffer, mask if i == 0 else None)
+            if buffer is None:
+                self._buffers[i] = scan
+
+        return scan
+
+
+class TemporalFilterBank:
+    """A class used to run the TemporalFilter of several sensors at once.
+    The D+1 most recent scans of all K sensors are kept in one (K, N, D+1) array
+    and the medians of every sensor updated by a call to update are found
+    with a single vectorized sort.
+
+    Sensors can have their own D and their own scan length. The array is sized for
+    the largest of each and the unused parts are left out when taking the medians.
+
+    Parameters
+    ----------
+    D : float or int, or a list of them
+        Number of scans besides the current one used for the medians,
+        either one value for all sensors or one value per sensor.
+    lengths : list of int
+        The length of the scans of every sensor. Its length is the number of sensors K.
+
+    Attributes
+    ----------
+    _D : np.ndarray
+        The D of every sensor.
+    _lengths : np.ndarray
+        The scan length of every sensor.
+    _history : np.ndarray
+        A (K, N, D+1) array holding the most recent scans of every sensor,
+        written in rotating order along the last axis. D and N are the largest D
+        and scan length. The samples of each index sit next to each other
+        so they can be sorted without rearranging the array first.
+    _write_index : np.ndarray
+        The place along the last axis of _history every sensor's next scan will be written into.
+    _count : np.ndarray
+        The number of scans stored for every sensor.
+    """
+    def __init__(self, D, lengths):
+        """Initializes a TemporalFilterBank object.
+
+        Parameters
+        ----------
+        D : float or int, or a list of them
+            Number of scans besides the current one used for the medians.
+        lengths : list of int
+            The length of the scans of every sensor.
+        """
+        # Make sure there is a scan length for every sensor.
+        if isinstance(lengths, (list, tuple, np.ndarray)) is False or len(lengths) == 0:
+            raise TypeError("TemporalFilterBank takes a list with the scan length of every sensor.")
+        for length in lengths:
+            if isinstance(length, (int, np.integer)) is False or length < 0:
+                raise TypeError("The scan length of every sensor must be a positive int.")
+
+        # Use one D for every sensor if a single number was passed.
+        # TemporalFilter checks and rounds every value of D for us.
+        if isinstance(D, (list, tuple, np.ndarray)) is False:
+            D = [D] * len(lengths)
+        if len(D) != len(lengths):
+            raise TypeError("TemporalFilterBank takes one D or one D for every sensor.")
+        D = [TemporalFilter(d)._D for d in D]
+
+        self._D = np.array(D, dtype=np.intp)
+        self._lengths = np.array(lengths, dtype=np.intp)
+        self._history = np.zeros((len(lengths), self._lengths.max(), self._D.max() + 1))
+        self._write_index = np.zeros(len(lengths), dtype=np.intp)
+        self._count = np.zeros(len(lengths), dtype=np.intp)
+
+
+    def update(self, scans, sensors=None):
+        """Updates the sensors with a new scan each and returns their medians.
+
+        Parameters
+        ----------
+        scans : list
+            One scan for every sensor being updated (a list or np.ndarray of numbers each).
+            A two-dimensional np.ndarray with one scan per row works as well.
+        sensors : list of int, optional
+            The sensors the scans belong to (default all sensors in order).
+
+        Returns
+        ----------
+        medians : list
+            An np.ndarray of medians for every sensor updated, in the same order as scans.
+        """
+        # Work out which sensors are being updated.
+        if sensors is None:
+            sensors = range(len(self._lengths))
+        sensors = np.array(sensors, dtype=np.intp).reshape(-1)
+        if len(np.unique(sensors)) != len(sensors):
+            raise TypeError("Every sensor can only be updated with one scan at a time.")
+        if len(sensors) and (sensors.min() < 0 or sensors.max() >= len(self._lengths)):
+            raise TypeError("There is no sensor with that number in the TemporalFilterBank.")
+        if len(scans) != len(sensors):
+            raise TypeError("update takes one scan for every sensor being updated.")
+
+        # Check all scans before storing any of them.
+        scans = [_as_scan_array(scan) for scan in scans]
+        for k, scan in zip(sensors, scans):
+            if len(scan) != self._lengths[k]:
                 raise TypeError('The length of the current scan must be the same as '
-                                'the length of the previous scan. \n Make a new '
-                                'TemporalFilter object if you wish to start '
-                                'filtering scans of a new length.')
-
-        # Check that scan is just a list of numbers. It should not be a list of lists.
-        for i in range(len(scan)):
-            if isinstance(scan[i], float) is False:
-                if isinstance(scan[i], int) is False:
-                    raise TypeError('The update method takes a scan as a parameter.'
-                                    ' Scan should be a list of numbers.')
-
-        # If the scan passes our previous checks
-        # then we can put it in the first position of the _recent_scans list.
-        self._recent_scans.insert(0, scan)
-
-        # Setting D to the object's _D variable
-        # and resetting the _current_y_list_
-        D = self._D
-        self._current_y_list = []
-
-        # This section deletes the oldest scan once the oldest scan
-        # no longer becomes necessary for calculating the _current_y_list_
-        if len(self._recent_scans) > D + 1:
-            del self._recent_scans[len(self._recent_scans) - 1]
-
-        # Storing the object's _recent_scans in the variable scans
-        scans = self._recent_scans
-
-        # The next section prevents an index out of range error
-        # which would happen when the number of scans we have is
-        # less than D + 1 . Remember this does not affect
-        # the Filter object's _D attribute
-        if len(scans) < D + 1:
-            D = len(scans) - 1
-
-        # For each number in the current scan we will create
-        # a new list that will store the groups that we
-        # will take the medians of.
-        for n in range(len(scan)):
-            scan_values_at_current_index = []
-
-            # Go through each recent scan ie scans[0], ..., scans[D]
-            # and pick the nth element in that scan and append it to scan_values_at_current_index
-            for t in range(D + 1):
-                scan_values_at_current_index.append(scans[t][n])
-
-            # Then take the median of the scan_values_at_current_index
-            # and append it to the object's _current_y_list .
-            median_n = np.median(scan_values_at_current_index)
-            self._current_y_list.append(median_n)
-
-        # And return the object's _current_y_list .
-        return self._current_y_list
+                                'the scan length given for sensor {}.'.format(k))
+
+        # Store every scan over the oldest scan of its sensor.
+        for k, scan in zip(sensors, scans):
+            self._history[k, :len(scan), self._write_index[k]] = scan
+        self._write_index[sensors] = (self._write_index[sensors] + 1) % (self._D[sensors] + 1)
+        self._count[sensors] = np.minimum(self._count[sensors] + 1, self._D[sensors] + 1)
+
+        medians = self._medians(sensors)
+        return [medians[i, :self._lengths[k]] for i, k in enumerate(sensors)]
+
+
+    def _medians(self, sensors):
+        """Returns a (len(sensors), N) array with the medians of the given sensors."""
+        count = self._count[sensors]
+
+        # Places beyond a sensor's stored scans get +inf so they sort behind all real samples.
+        # Real NaNs still sort behind them, so a NaN among the stored samples ends up last.
+        window = self._history[sensors]
+        np.copyto(window, np.inf, where=(np.arange(window.shape[2]) >= count[:, None])[:, None, :])
+        window.sort(axis=2)
+
+        # Read the middle samples of every sensor, which is the same as np.median
+        # (a single middle sample for an odd count, the mean of two for an even count).
+        low = np.take_along_axis(window, ((count - 1) // 2)[:, None, None], axis=2)[..., 0]
+        high = np.take_along_axis(window, (count // 2)[:, None, None], axis=2)[..., 0]
+        medians = np.where((count % 2 == 1)[:, None], high, (low + high) / 2)
+        medians[np.isnan(window[..., -1])] = np.nan
+        return medians
+
+
+class ParallelReprocessor:
+    """A class used to filter a long recording of scans on several processes.
+
+    The scans are split into chunks of consecutive scans. Every chunk is filtered
+    by its own process, starting from the D scans in front of it, so that
+    the result is exactly the same as filtering all scans one after the other.
+
+    Parameters
+    ----------
+    D : float or int
+        Number of scans besides the current one used by the TemporalFilter.
+    range_min : float or int, optional
+        If given, scans are run through a RangeFilter(range_min, range_max) first.
+    range_max : float or int, optional
+        The range_max of that RangeFilter (default 50).
+    workers : int, optional
+        Number of processes (default the number of CPUs).
+    chunk_size : int, optional
+        Number of scans in a chunk (default enough for four chunks per process).
+
+    Attributes
+    ----------
+    _report : dict
+        Filled in by run with the number of scans, chunks and workers,
+        the seconds it took and the scans filtered per second.
+
+    Note
+    ----------
+    Worker processes may import the calling script again, so on platforms that
+    start processes with "spawn" run must be called from under
+    if __name__ == "__main__": .
+    """
+    def __init__(self, D: int, range_min: float = None, range_max: float = 50,
+                 workers: int = None, chunk_size: int = None):
+        """Initializes a ParallelReprocessor object.
+
+        Parameters
+        ----------
+        D : float or int
+            Number of scans besides the current one used by the TemporalFilter.
+        range_min : float or int, optional
+            If given, scans are run through a RangeFilter(range_min, range_max) first.
+        range_max : float or int, optional
+            The range_max of that RangeFilter (default 50).
+        workers : int, optional
+            Number of processes (default the number of CPUs).
+        chunk_size : int, optional
+            Number of scans in a chunk.
+        """
+        # Let the filters check their own arguments.
+        self._D = TemporalFilter(D)._D
+        self._bounds = None
+        if range_min is not None:
+            range_filter = RangeFilter(range_min, range_max)
+            self._bounds = (range_filter._min, range_filter._max)
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if isinstance(workers, int) is False or workers < 1:
+            raise TypeError("workers must be a positive int")
+        if chunk_size is not None and (isinstance(chunk_size, int) is False or chunk_size < 1):
+            raise TypeError("chunk_size must be a positive int")
+
+        self._workers = workers
+        self._chunk_size = chunk_size
+        self._report = {}
+
+
+    def run(self, scans):
+        """Filters scans and returns the result.
+
+        Parameters
+        ----------
+        scans : A (T, N) np.ndarray or a list of T scans of length N.
+
+        Returns
+        ----------
+        filtered_scans : np.ndarray
+            A (T, N) array equal to what a TemporalFilter (after a RangeFilter
+            if range_min was given) returns when updated with each scan in turn.
+        """
+        scans = _as_scan_stack(scans)
+        start_time = time.perf_counter()
+
+        # Split the scans into chunks, each with the D scans in front of it as a seed.
+        chunk_size = self._chunk_size
+        if chunk_size is None:
+            chunk_size = max(1, -(-len(scans) // (4 * self._workers)))
+        starts = range(0, len(scans), chunk_size)
+        jobs = [(self._D, self._bounds, scans[max(0, start - self._D):start], scans[start:start + chunk_size])
+                for start in starts]
+
+        # A single worker doesn't need a process pool.
+        if self._workers == 1 or len(jobs) <= 1:
+            results = [_reprocess_chunk(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=self._workers) as pool:
+                results = list(pool.map(_reprocess_chunk, *zip(*jobs)))
+
+        filtered_scans = np.concatenate(results) if results else np.empty(scans.shape, dtype=scans.dtype)
+
+        # Report how long it took.
+        seconds = time.perf_counter() - start_time
+        self._report = {
+            "scans": len(scans),
+            "chunks": len(jobs),
+            "workers": self._workers,
+            "seconds": seconds,
+            "scans_per_second": len(scans) / seconds if seconds > 0 else float("inf"),
+        }
+        return filtered_scans
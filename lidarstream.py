@@ -0,0 +1,186 @@
+"""
+Asyncio streaming of LIDAR scans through filters from lidarfilters.py
+"""
+import asyncio
+import collections
+
+import numpy as np
+
+import lidarfilters as filters
+
+# What ScanStream does with a new scan when its queue is full.
+_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+
+class ScanStream:
+    """A class used to run scans arriving from an async iterator through filters.
+
+    Incoming scans go into a bounded queue that is read by the filtering side,
+    so a slow consumer never stalls the receiving side without it being counted.
+    When the queue is full the policy decides what happens:
+    "block" waits for room (which pauses reading the source), "drop_oldest" throws away
+    the oldest queued scan and "drop_newest" throws away the scan that just arrived.
+
+    Parameters
+    ----------
+    stages : FilterPipeline, RangeFilter or TemporalFilter, or a list of filters
+        The filters every scan goes through.
+    maxsize : int, optional
+        The number of scans the queue can hold (default 8).
+    policy : str, optional
+        "block", "drop_oldest" or "drop_newest" (default "block").
+    executor_threshold : int, optional
+        Scans with at least this many values are filtered on a worker thread
+        so the event loop stays responsive (default 100000).
+
+    Attributes
+    ----------
+    _received : int
+        The number of scans read from the source.
+    _dropped : int
+        The number of scans thrown away because the queue was full.
+    _filtered : int
+        The number of filtered scans handed out.
+    """
+    def __init__(self, stages, maxsize: int = 8, policy: str = "block", executor_threshold: int = 100000):
+        """Initializes a ScanStream object.
+
+        Parameters
+        ----------
+        stages : FilterPipeline, RangeFilter or TemporalFilter, or a list of filters
+            The filters every scan goes through.
+        maxsize : int, optional
+            The number of scans the queue can hold (default 8).
+        policy : str, optional
+            "block", "drop_oldest" or "drop_newest" (default "block").
+        executor_threshold : int, optional
+            Scans with at least this many values are filtered on a worker thread.
+        """
+        if isinstance(stages, filters.FilterPipeline) is False:
+            if isinstance(stages, (list, tuple)) is False:
+                stages = [stages]
+            stages = filters.FilterPipeline(*stages)
+        if isinstance(maxsize, int) is False or maxsize < 1:
+            raise TypeError("maxsize must be a positive int")
+        if policy not in _POLICIES:
+            raise TypeError('policy must be "block", "drop_oldest" or "drop_newest"')
+
+        self._pipeline = stages
+        self._maxsize = maxsize
+        self._policy = policy
+        self._executor_threshold = executor_threshold
+        self._received = 0
+        self._dropped = 0
+        self._filtered = 0
+
+
+    async def filter(self, source):
+        """Reads scans from source and yields them filtered, in order.
+
+        Parameters
+        ----------
+        source : async iterator
+            Yields scans (lists or np.ndarrays of numbers).
+
+        Yields
+        ----------
+        filtered_scan : np.ndarray
+            The output of the filters for a scan that wasn't dropped.
+        """
+        queue = collections.deque()
+        changed = asyncio.Condition()
+        finished = False
+
+        async def receive():
+            # Move scans from the source into the queue following the policy.
+            nonlocal finished
+            try:
+                async for scan in source:
+                    self._received += 1
+                    async with changed:
+                        if len(queue) >= self._maxsize:
+                            if self._policy == "block":
+                                await changed.wait_for(lambda: len(queue) < self._maxsize)
+                            elif self._policy == "drop_oldest":
+                                queue.popleft()
+                                self._dropped += 1
+                            else:
+                                self._dropped += 1
+                                continue
+                        queue.append(scan)
+                        changed.notify_all()
+            finally:
+                async with changed:
+                    finished = True
+                    changed.notify_all()
+
+        receiver = asyncio.ensure_future(receive())
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                # Wait for a scan, or for the source to run out.
+                async with changed:
+                    await changed.wait_for(lambda: queue or finished)
+                    if not queue:
+                        break
+                    scan = queue.popleft()
+                    changed.notify_all()
+
+                # Large scans are filtered on a worker thread. The pipeline reuses its output
+                # array, so a copy is handed out.
+                if np.size(scan) >= self._executor_threshold:
+                    filtered_scan = await loop.run_in_executor(None, self._filter, scan)
+                else:
+                    filtered_scan = self._filter(scan)
+                self._filtered += 1
+                yield filtered_scan
+
+            # Let any error raised while reading the source come through.
+            await receiver
+        finally:
+            receiver.cancel()
+
+
+    def _filter(self, scan):
+        """Runs scan through the pipeline and returns a copy of the result."""
+        return self._pipeline.update(scan).copy()
+
+
+class _DatagramQueue(asyncio.DatagramProtocol):
+    """Puts the payload of every datagram received into an asyncio.Queue ."""
+    def __init__(self, queue):
+        self._queue = queue
+
+    def datagram_received(self, data, address):
+        self._queue.put_nowait(data)
+
+
+async def udp_scans(host: str, port: int, dtype=np.float32, count: int = None):
+    """Yields the scans sent to a UDP port, one scan per datagram.
+
+    Parameters
+    ----------
+    host : str
+        The address to listen on.
+    port : int
+        The port to listen on.
+    dtype : np.dtype, optional
+        The dtype of the values in a datagram (default float32).
+    count : int, optional
+        Stop after this many scans (default never stop).
+
+    Yields
+    ----------
+    scan : np.ndarray
+        The values of a datagram.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    transport, _ = await loop.create_datagram_endpoint(lambda: _DatagramQueue(queue), local_addr=(host, port))
+    try:
+        received = 0
+        while count is None or received < count:
+            yield np.frombuffer(await queue.get(), dtype=dtype)
+            received += 1
+    finally:
+        transport.close()
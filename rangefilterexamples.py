@@ -29,6 +29,23 @@ print(range_filtered_list)
 #                        ])
 # print(range_filter_object.update(numpy_scan))
 
+# For long scans update_array clamps an np.ndarray in one vectorized step
+# and returns an np.ndarray with the same dtype instead of a list.
+# An out array can be passed to reuse memory between scans.
+# filtered_numpy_scan = np.empty_like(numpy_scan)
+# range_filter_object.update_array(numpy_scan, out=filtered_numpy_scan)
+# print(filtered_numpy_scan)
+
+# Scans in millimeters stored as uint16 stay uint16. With scale=1000
+# range_min and range_max are still given in meters.
+# millimeter_filter = filters.RangeFilter(.03, 50, scale=1000)
+# print(millimeter_filter.update_array(np.array([10, 2500, 65000], dtype=np.uint16)))
+
+# A dropout (a 0 where no return came back) would be clamped up to range_min and look
+# like a close obstacle. Passing it as dropout returns it unchanged instead.
+# dropout_range_filter = filters.RangeFilter(.03, 50, dropout=0)
+# print(dropout_range_filter.update([0, .01, 25]))
+
 # We can also make a new RangeFilter object with a range_min and range_max specified by the user.
 # In this example our RangeFilter object will have a range_min of 2 and a range_max of 25.
 # range_filter_object_with_range_specified_by_user = filters.RangeFilter(2, 25)
@@ -0,0 +1,291 @@
+"""
+Binary scan logs for LIDAR scans
+
+A scan log is a 64 byte header followed by one record per scan. Without timestamps
+a record is just the N numbers of the scan, so the scans form one contiguous (T, N)
+block. With timestamps every record starts with a float64 timestamp, so the (T, N)
+view of the scans is strided rather than contiguous (np.ascontiguousarray copies it).
+Keeping each timestamp with its scan lets scans be appended one at a time and
+leaves every complete record readable if the writer is stopped half way through.
+The file can be memory-mapped and read without loading it into memory.
+"""
+import struct
+
+import numpy as np
+
+# The header holds the magic bytes, the format version, the dtype of the scans,
+# whether records start with a timestamp and the scan length N.
+_MAGIC = b"LIDARLOG"
+_VERSION = 1
+_HEADER = struct.Struct("<8sH8s?Q")
+_HEADER_SIZE = 64
+
+
+def _record_dtype(length, dtype, timestamps):
+    """Returns the dtype of one record of a scan log."""
+    if timestamps:
+        return np.dtype([("timestamp", "<f8"), ("scan", dtype, (length,))])
+    return np.dtype((dtype, (length,)))
+
+
+class ScanLogWriter:
+    """A class used to write scans to a scan log one scan or batch of scans at a time.
+    Scans are appended to the file as they come so a whole session never has to be in memory.
+
+    Parameters
+    ----------
+    path : str
+        The file to write. An existing file is overwritten.
+    length : int
+        The number of values in every scan (N).
+    dtype : np.dtype, optional
+        The dtype the scans are stored as (default float32).
+    timestamps : bool, optional
+        Whether every scan is stored with a timestamp (default False).
+
+    Attributes
+    ----------
+    _length : int
+        The number of values in every scan.
+    _dtype : np.dtype
+        The dtype the scans are stored as.
+    _timestamps : bool
+        Whether every scan is stored with a timestamp.
+    _count : int
+        The number of scans written so far.
+    """
+    def __init__(self, path, length: int, dtype=np.float32, timestamps: bool = False):
+        """Initializes a ScanLogWriter object and writes the header of the scan log.
+
+        Parameters
+        ----------
+        path : str
+            The file to write.
+        length : int
+            The number of values in every scan.
+        dtype : np.dtype, optional
+            The dtype the scans are stored as (default float32).
+        timestamps : bool, optional
+            Whether every scan is stored with a timestamp (default False).
+        """
+        if isinstance(length, (int, np.integer)) is False or length < 0:
+            raise TypeError("length must be a positive int")
+
+        dtype = np.dtype(dtype).newbyteorder("<")
+        if dtype.kind not in "iuf":
+            raise TypeError("A scan log can only store numbers.")
+
+        self._length = int(length)
+        self._dtype = dtype
+        self._timestamps = bool(timestamps)
+        self._record = _record_dtype(self._length, self._dtype, self._timestamps)
+        self._count = 0
+
+        # Write the header and pad it to its full size.
+        self._file = open(path, "wb")
+        header = _HEADER.pack(_MAGIC, _VERSION, dtype.str.encode("ascii"), self._timestamps, self._length)
+        self._file.write(header.ljust(_HEADER_SIZE, b"\0"))
+
+
+    def append(self, scan, timestamp: float = None):
+        """Appends a single scan to the log.
+
+        Parameters
+        ----------
+        scan : One-dimensional array of numbers either as a list or np.ndarray .
+        timestamp : float, optional
+            The time of the scan. Needed if the log stores timestamps.
+        """
+        timestamps = None if timestamp is None else [timestamp]
+        self.append_batch(np.asarray(scan)[None], timestamps)
+
+
+    def append_batch(self, scans, timestamps=None):
+        """Appends T consecutive scans to the log.
+
+        Parameters
+        ----------
+        scans : A (T, N) np.ndarray or a list of T scans of length N.
+        timestamps : One-dimensional array of T numbers, optional
+            The times of the scans. Needed if the log stores timestamps.
+        """
+        scans = np.asarray(scans)
+        if scans.ndim != 2 or scans.shape[1] != self._length:
+            raise TypeError("Every scan written to this log must have {} values.".format(self._length))
+
+        # Build the records and write them straight to the end of the file.
+        records = np.empty(len(scans), dtype=self._record)
+        if self._timestamps:
+            if timestamps is None or len(timestamps) != len(scans):
+                raise TypeError("This log stores a timestamp with every scan.")
+            records["timestamp"] = timestamps
+            records["scan"] = scans
+        else:
+            if timestamps is not None:
+                raise TypeError("This log doesn't store timestamps.")
+            records[...] = scans
+        self._file.write(records.tobytes())
+        self._count += len(scans)
+
+
+    def flush(self):
+        """Makes sure everything appended so far is in the file."""
+        self._file.flush()
+
+
+    def close(self):
+        """Closes the file."""
+        self._file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ScanLogReader:
+    """A class used to read a scan log through a memory map.
+    Scans and chunks of scans are returned as np.ndarray views into the file,
+    so the operating system only loads the parts being read.
+
+    Parameters
+    ----------
+    path : str
+        The scan log to read.
+
+    Attributes
+    ----------
+    _length : int
+        The number of values in every scan.
+    _dtype : np.dtype
+        The dtype of the scans.
+    _records : np.memmap or np.ndarray
+        The records of the file, one per scan.
+    scans : np.ndarray
+        A (T, N) view of all scans in the file. It is contiguous unless the log
+        stores timestamps, which sit between the scans.
+    timestamps : np.ndarray or None
+        A view of the T timestamps, or None if the log doesn't store them.
+    """
+    def __init__(self, path):
+        """Initializes a ScanLogReader object and maps the file into memory.
+
+        Parameters
+        ----------
+        path : str
+            The scan log to read.
+        """
+        with open(path, "rb") as log_file:
+            header = log_file.read(_HEADER_SIZE)
+            log_file.seek(0, 2)
+            size = log_file.tell()
+
+        # Check the header.
+        if len(header) < _HEADER_SIZE:
+            raise TypeError("{} is not a scan log.".format(path))
+        magic, version, dtype, timestamps, length = _HEADER.unpack(header[:_HEADER.size])
+        if magic != _MAGIC:
+            raise TypeError("{} is not a scan log.".format(path))
+        if version != _VERSION:
+            raise TypeError("{} is a scan log of an unknown version ({}).".format(path, version))
+
+        self._length = length
+        self._dtype = np.dtype(dtype.rstrip(b"\0").decode("ascii"))
+        record = _record_dtype(length, self._dtype, timestamps)
+
+        # The number of scans follows from the size of the file. A record cut short
+        # by a writer that was stopped half way through is left out.
+        count = (size - _HEADER_SIZE) // record.itemsize if record.itemsize else 0
+        if count:
+            self._records = np.memmap(path, dtype=record, mode="r", offset=_HEADER_SIZE, shape=(count,))
+        else:
+            self._records = np.empty(0, dtype=record)
+
+        if timestamps:
+            self.scans = self._records["scan"]
+            self.timestamps = self._records["timestamp"]
+        else:
+            self.scans = self._records.view(self._dtype).reshape(count, length)
+            self.timestamps = None
+
+
+    def __len__(self):
+        return len(self.scans)
+
+
+    def __getitem__(self, t):
+        return self.scans[t]
+
+
+    def __iter__(self):
+        """Yields every scan as a view into the file."""
+        return iter(self.scans)
+
+
+    def chunks(self, size: int = 1024):
+        """Yields the scans as (size, N) views into the file (the last one may be shorter).
+        With timestamps (scans, timestamps) pairs are yielded instead.
+
+        Parameters
+        ----------
+        size : int, optional
+            The number of scans in a chunk (default 1024).
+        """
+        if isinstance(size, int) is False or size < 1:
+            raise TypeError("size must be a positive int")
+        for start in range(0, len(self.scans), size):
+            if self.timestamps is None:
+                yield self.scans[start:start + size]
+            else:
+                yield self.scans[start:start + size], self.timestamps[start:start + size]
+
+
+    def close(self):
+        """Drops the reader's references to the memory map. The file is unmapped
+        once no views returned by the reader are left either."""
+        self.scans = self.timestamps = self._records = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def filter_scan_log(source, destination, filters, chunk_size: int = 1024, dtype=None):
+    """Streams the scans of one scan log through filters into another scan log.
+    Only one chunk of scans is in memory at a time.
+
+    Parameters
+    ----------
+    source : str
+        The scan log to read.
+    destination : str
+        The scan log to write. Timestamps are copied over.
+    filters : list
+        RangeFilter and TemporalFilter objects (anything with an update_batch method),
+        in the order the scans go through them.
+    chunk_size : int, optional
+        The number of scans filtered at once (default 1024).
+    dtype : np.dtype, optional
+        The dtype of the written scans (default the dtype of the source).
+
+    Returns
+    ----------
+    count : int
+        The number of scans written.
+    """
+    with ScanLogReader(source) as reader:
+        timestamps = reader.timestamps is not None
+        with ScanLogWriter(destination, reader._length, dtype or reader._dtype, timestamps) as writer:
+            for chunk in reader.chunks(chunk_size):
+                scans, times = chunk if timestamps else (chunk, None)
+                for stage in filters:
+                    scans = stage.update_batch(scans)
+                writer.append_batch(scans, times)
+            return writer._count
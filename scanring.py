@@ -0,0 +1,340 @@
+"""
+Shared memory rings of filtered LIDAR scans
+
+A ScanRingWriter filters scans straight into one of the slots of a ring kept in
+multiprocessing.shared_memory, so any number of processes can read them through
+a ScanRingReader without the scans being pickled or copied. Readers never take a lock.
+Every slot has a sequence counter that is odd while the slot is being written and
+holds 2 * n once scan number n is in it, so a reader can tell whether a scan it
+is looking at has been overwritten.
+
+    writer = ScanRingWriter("lidar", 360)                # in the filtering process
+    writer.update(temporal_filter, scan)
+
+    reader = ScanRingReader("lidar")                      # in another process
+    number, scan = reader.next()
+
+The shared memory is 64 bytes of header, the counters and then the (slots, N) scans.
+"""
+import struct
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# The header holds the magic bytes, the number of slots, the scan length N
+# and the dtype of the scans.
+_MAGIC = b"SCANRING"
+_HEADER = struct.Struct("<8sQQ8s")
+_HEADER_SIZE = 64
+
+
+def _layout(slots, length, dtype):
+    """Returns the offset of the scans and the size of a ring's shared memory."""
+    # The counters are the number of scans written followed by one sequence counter per slot.
+    data_offset = -(-(_HEADER_SIZE + 8 * (slots + 1)) // 64) * 64
+    return data_offset, data_offset + slots * length * dtype.itemsize
+
+
+def _views(buffer, slots, length, dtype):
+    """Returns the counters and the scans of a ring as np.ndarray views into buffer."""
+    data_offset, _ = _layout(slots, length, dtype)
+    counters = np.ndarray((slots + 1,), dtype="<i8", buffer=buffer, offset=_HEADER_SIZE)
+    scans = np.ndarray((slots, length), dtype=dtype, buffer=buffer, offset=data_offset)
+    return counters, scans
+
+
+def _close(memory):
+    """Closes shared memory. While np.ndarray views into it are still around (for example
+    the _current_y of a TemporalFilter that wrote into a slot) it can't be unmapped yet,
+    which then happens once the last view is gone."""
+    try:
+        memory.close()
+    except BufferError:
+        pass
+
+
+class ScanRingWriter:
+    """A class used to publish scans, usually the output of a filter, to a ring of slots
+    in shared memory that other processes read with a ScanRingReader .
+
+    Parameters
+    ----------
+    name : str
+        The name of the shared memory. Readers attach to the ring by this name.
+    length : int
+        The number of values in every scan (N).
+    dtype : np.dtype, optional
+        The dtype of the scans (default float64).
+    slots : int, optional
+        The number of scans the ring holds before the oldest one is overwritten (default 8).
+        At least 2.
+
+    Attributes
+    ----------
+    _length : int
+        The number of values in every scan.
+    _dtype : np.dtype
+        The dtype of the scans.
+    _slots : int
+        The number of slots of the ring.
+    _count : int
+        The number of scans written so far.
+    """
+    def __init__(self, name: str, length: int, dtype=np.float64, slots: int = 8):
+        """Initializes a ScanRingWriter object and creates the shared memory.
+
+        Parameters
+        ----------
+        name : str
+            The name of the shared memory.
+        length : int
+            The number of values in every scan.
+        dtype : np.dtype, optional
+            The dtype of the scans (default float64).
+        slots : int, optional
+            The number of scans the ring holds, at least 2 (default 8).
+        """
+        if isinstance(length, (int, np.integer)) is False or length < 1:
+            raise TypeError("length must be a positive int")
+        # next leaves one slot for the writer to move on to while a scan is read.
+        if isinstance(slots, int) is False or slots < 2:
+            raise TypeError("slots must be an int of at least 2")
+
+        dtype = np.dtype(dtype).newbyteorder("<")
+        if dtype.kind not in "iuf":
+            raise TypeError("A scan ring can only hold numbers.")
+
+        self._length = int(length)
+        self._dtype = dtype
+        self._slots = slots
+        self._count = 0
+
+        # Create the shared memory and write the header.
+        _, size = _layout(slots, self._length, dtype)
+        self._memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _HEADER.pack_into(self._memory.buf, 0, _MAGIC, slots, self._length, dtype.str.encode("ascii"))
+        self._counters, self._scans = _views(self._memory.buf, slots, self._length, dtype)
+        self._counters[:] = 0
+
+
+    def update(self, stage, scan):
+        """Runs scan through a filter and writes the output straight into the next slot.
+        The filter keeps no copy of its own, so the _current_y of a TemporalFilter
+        is the slot and changes once the writer goes round the ring and reuses it.
+
+        Parameters
+        ----------
+        stage : RangeFilter, TemporalFilter or FilterPipeline
+            The filter the scan goes through.
+        scan : One-dimensional array of numbers either as a list or np.ndarray .
+
+        Returns
+        ----------
+        number : int
+            The number of the scan in the ring, counting from 1.
+        """
+        slot = self._begin()
+        if hasattr(stage, "update_array"):
+            stage.update_array(scan, out=self._scans[slot])
+        else:
+            stage.update(scan, out=self._scans[slot])
+        return self._end(slot)
+
+
+    def publish(self, scan):
+        """Copies an already filtered scan into the next slot.
+
+        Parameters
+        ----------
+        scan : One-dimensional array of numbers either as a list or np.ndarray .
+
+        Returns
+        ----------
+        number : int
+            The number of the scan in the ring, counting from 1.
+        """
+        if np.shape(scan) != (self._length,):
+            raise TypeError("Every scan published to this ring must have {} values.".format(self._length))
+        slot = self._begin()
+        self._scans[slot] = scan
+        return self._end(slot)
+
+
+    def _begin(self):
+        """Marks the slot of the next scan as being written and returns it."""
+        slot = self._count % self._slots
+        self._counters[1 + slot] = 2 * self._count + 1
+        return slot
+
+
+    def _end(self, slot):
+        """Marks the scan in slot as written and counts it."""
+        self._count += 1
+        self._counters[1 + slot] = 2 * self._count
+        self._counters[0] = self._count
+        return self._count
+
+
+    def close(self, unlink: bool = True):
+        """Closes the shared memory and, unless unlink is False, removes it.
+        Readers that are still attached keep their mapping until they close."""
+        self._counters = self._scans = None
+        _close(self._memory)
+        if unlink:
+            self._memory.unlink()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ScanRingReader:
+    """A class used to read the scans published by a ScanRingWriter in another process.
+
+    Scans are returned as np.ndarray views into the shared memory. A view stays
+    valid until the writer has gone round the ring and reuses its slot, which
+    is_current tells. Pass copy=True to get a copy that is checked to be whole.
+
+    Parameters
+    ----------
+    name : str
+        The name of the shared memory of the ring.
+
+    Attributes
+    ----------
+    _length : int
+        The number of values in every scan.
+    _dtype : np.dtype
+        The dtype of the scans.
+    _slots : int
+        The number of slots of the ring.
+    _last : int
+        The number of the last scan returned by next (0 before the first one).
+    _missed : int
+        The number of scans next skipped because they were overwritten before being read.
+    """
+    def __init__(self, name: str):
+        """Initializes a ScanRingReader object and attaches to the shared memory.
+
+        Parameters
+        ----------
+        name : str
+            The name of the shared memory of the ring.
+        """
+        # The writer owns the shared memory, so readers don't let the resource
+        # tracker remove it when they exit (track only exists from Python 3.13 on).
+        try:
+            self._memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            self._memory = shared_memory.SharedMemory(name=name)
+
+        magic, slots, length, dtype = _HEADER.unpack_from(self._memory.buf, 0)
+        if magic != _MAGIC:
+            self._memory.close()
+            raise TypeError("{} is not a scan ring.".format(name))
+
+        self._slots = slots
+        self._length = length
+        self._dtype = np.dtype(dtype.rstrip(b"\0").decode("ascii"))
+        self._counters, self._scans = _views(self._memory.buf, slots, length, self._dtype)
+        self._last = 0
+        self._missed = 0
+
+
+    def latest(self, copy: bool = False):
+        """Returns the most recent scan, or None if nothing has been published yet.
+
+        Parameters
+        ----------
+        copy : bool, optional
+            Return a copy instead of a view into the shared memory (default False).
+
+        Returns
+        ----------
+        (number, scan) : tuple of int and np.ndarray
+            The number of the scan, counting from 1, and the scan.
+        """
+        number = int(self._counters[0])
+        if number == 0:
+            return None
+        return self._read(number, copy)
+
+
+    def next(self, timeout: float = None, copy: bool = False, poll: float = 1e-4):
+        """Returns the scan after the one next returned last time, waiting for it if needed.
+        If the writer has already overwritten it the oldest scan still in the ring is returned.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait before giving up and returning None (default wait forever).
+        copy : bool, optional
+            Return a copy instead of a view into the shared memory (default False).
+        poll : float, optional
+            Seconds between checks for a new scan (default 0.0001).
+
+        Returns
+        ----------
+        (number, scan) : tuple of int and np.ndarray, or None
+            The number of the scan, counting from 1, and the scan.
+        """
+        started = time.perf_counter()
+        while True:
+            written = int(self._counters[0])
+            if written > self._last:
+                break
+            if timeout is not None and time.perf_counter() - started >= timeout:
+                return None
+            time.sleep(poll)
+
+        # Skip the scans that were overwritten before they were read.
+        # One slot is left as room for the writer moving on while this scan is read.
+        # A copy can end up with a newer scan, which is the one counted as read.
+        number = max(self._last + 1, written - self._slots + 2, 1)
+        number, scan = self._read(number, copy)
+        self._missed += number - self._last - 1
+        self._last = number
+        return number, scan
+
+
+    def is_current(self, number: int):
+        """Returns whether scan number is still in its slot, i.e. whether
+        a view returned for it still shows that scan."""
+        return int(self._counters[1 + (number - 1) % self._slots]) == 2 * number
+
+
+    def _read(self, number, copy):
+        """Returns number and scan number as a view or, with copy, as a copy
+        that was not written to while it was copied. If the scan was overwritten first
+        the copy is of the newest scan and its number is returned instead."""
+        if copy is False:
+            return number, self._scans[(number - 1) % self._slots]
+
+        # Check the sequence counter before and after copying. If the scan was
+        # overwritten in the meantime the newest scan is read instead.
+        while True:
+            if self.is_current(number):
+                scan = self._scans[(number - 1) % self._slots].copy()
+                if self.is_current(number):
+                    return number, scan
+            number = int(self._counters[0])
+
+
+    def close(self):
+        """Detaches from the shared memory. The memory stays mapped until no views returned
+        by the reader are left."""
+        self._counters = self._scans = None
+        _close(self._memory)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,60 @@
+"""Stream Examples"""
+
+import asyncio
+import socket
+
+import lidarfilters as filters
+import lidarstream
+import numpy as np
+
+
+# A ScanStream reads scans from an async iterator and hands them out filtered.
+# Here the scans come from a producer inside this program that makes a new
+# scan of 360 values every millisecond.
+async def producer(number_of_scans):
+    rng = np.random.default_rng(0)
+    for i in range(number_of_scans):
+        await asyncio.sleep(0.001)
+        yield rng.uniform(-1, 60, 360)
+
+
+async def filter_scans():
+    stream = lidarstream.ScanStream([filters.RangeFilter(), filters.TemporalFilter(3)])
+    async for filtered_scan in stream.filter(producer(20)):
+        print(filtered_scan[:5])
+
+asyncio.run(filter_scans())
+
+
+# When the consumer is slower than the producer the queue fills up.
+# With the "drop_oldest" policy the oldest queued scans are thrown away
+# and counted in the stream's _dropped attribute.
+async def filter_scans_slowly():
+    stream = lidarstream.ScanStream(filters.TemporalFilter(3), maxsize=2, policy="drop_oldest")
+    async for filtered_scan in stream.filter(producer(20)):
+        await asyncio.sleep(0.01)
+    print("received {} scans, dropped {}, filtered {}".format(
+        stream._received, stream._dropped, stream._filtered))
+
+asyncio.run(filter_scans_slowly())
+
+
+# Scans can also be read from a UDP port, one scan per datagram.
+# Here this program sends the datagrams to itself.
+async def filter_udp_scans():
+    source = lidarstream.udp_scans("127.0.0.1", 50007, count=5)
+    stream = lidarstream.ScanStream(filters.RangeFilter(2, 25))
+
+    async def send():
+        await asyncio.sleep(0.1)
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for i in range(5):
+            sender.sendto(np.linspace(0, 50, 360, dtype=np.float32).tobytes(), ("127.0.0.1", 50007))
+        sender.close()
+
+    sending = asyncio.ensure_future(send())
+    async for filtered_scan in stream.filter(source):
+        print(filtered_scan.min(), filtered_scan.max())
+    await sending
+
+# asyncio.run(filter_udp_scans())
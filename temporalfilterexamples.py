@@ -22,6 +22,69 @@ default_delay = 2
 D = 3
 temporal_filter_object = filters.TemporalFilter(D)
 
+# For large values of D a TemporalFilter can keep the values of every index sorted
+# and only swap the oldest value for the newest one on each update.
+# The medians are exactly the same, they are just found faster.
+# fast_temporal_filter_object = filters.TemporalFilter(D, median_mode="incremental")
+
+# Scans in whole centimeters between 0 and 5000 can be filtered with a histogram of
+# every index instead. Each update then costs the same no matter how large D is.
+# long_temporal_filter_object = filters.TemporalFilter(1000, median_mode="histogram",
+#                                                      resolution=1, value_range=(0, 5000))
+
+# When the frame rate varies the window can be a length of time instead. With max_age=0.5
+# update_timed takes the medians over the scans of the last half second (at most D+1 of them).
+# timed_temporal_filter_object = filters.TemporalFilter(20, max_age=0.5)
+# print(timed_temporal_filter_object.update_timed([1, 2, 3], timestamp=12.25))
+
+# A SpatioTemporalFilter takes the median over the neighbouring indexes as well,
+# here 2 on each side, so a spike in a single beam that lasts several scans is removed too.
+# The first and last index are neighbours unless wrap=False is passed.
+# spatio_temporal_filter_object = filters.SpatioTemporalFilter(D, radius=2)
+# print(spatio_temporal_filter_object.update([5, 5, 40, 5, 5, 5]))
+
+# A scan can also be a range image, I.e. a (rings, beams) np.ndarray or a list of lists.
+# Every index gets its own median and the medians keep the shape of the image.
+# image_temporal_filter_object = filters.TemporalFilter(D)
+# print(image_temporal_filter_object.update([[1, 2, 3], [4, 5, 6]]))
+
+# Sensors that report 0 (or infinity) when no return came back can pass that value as dropout.
+# Dropouts are left out of the medians, and so are the samples marked True in a mask.
+# _valid_count holds the number of valid samples each median was taken over.
+# dropout_temporal_filter_object = filters.TemporalFilter(D, dropout=0)
+# print(dropout_temporal_filter_object.update([0, 2, 3], mask=[False, False, True]))
+# print(dropout_temporal_filter_object._valid_count)
+
+# Instead of the median a TemporalFilter can take the mean, a percentile such as "p10"
+# or a trimmed mean such as "trim10" (leaving out the lowest and highest 10%).
+# Given several statistics update returns the first one and _current_statistics holds them all.
+# statistics_temporal_filter_object = filters.TemporalFilter(D, statistics=("p10", "mean", "median"))
+# print(statistics_temporal_filter_object.update([1, 2, 3]))
+# print(statistics_temporal_filter_object._current_statistics["mean"])
+
+# When most beams barely change between scans, I.e. on a parked vehicle, a tolerance makes
+# update take the median again only for the beams whose new sample could change it.
+# tolerance=0 still returns the exact medians. With tolerance=0.01 every median is within
+# 0.01 of the exact one. _recomputed_fraction tells how many beams were done again.
+# gated_temporal_filter_object = filters.TemporalFilter(D, tolerance=0.01)
+# gated_temporal_filter_object.update([1, 2, 3])
+# print(gated_temporal_filter_object._recomputed_fraction)
+
+# Scans with hundreds of thousands of values can be split between several threads.
+# The medians are exactly the same as with a single thread.
+# threaded_temporal_filter_object = filters.TemporalFilter(D, workers=4)
+
+# The medians are taken by NumPy unless another backend is asked for. backend="jit" runs
+# compiled kernels (numba has to be installed) and backend="python" the plain Python loops.
+# The medians are the same.
+# python_temporal_filter_object = filters.TemporalFilter(D, backend="python")
+
+# The stored scans can be saved to a file and loaded into a new TemporalFilter,
+# for example after a restart, so it carries on with a full window of D+1 scans.
+# temporal_filter_object.save_state("temporal_filter_state.log")
+# restarted_temporal_filter_object = filters.TemporalFilter(D)
+# restarted_temporal_filter_object.load_state("temporal_filter_state.log")
+
 
 # We can then update the TemporalFilter object with a list of numbers ie a scan.
 # In this case our scan will be new_scan0
@@ -74,6 +137,12 @@ for i in range(4):
     filtered_scan = range_filter.update(scans[i])
     print(temporal_filter_object.update(filtered_scan))
 
+# The same can be done with a FilterPipeline, which checks every scan once
+# and passes it from filter to filter as an np.ndarray .
+# pipeline = filters.FilterPipeline(filters.RangeFilter(1.5, 6), filters.TemporalFilter(D))
+# for i in range(4):
+#     print(pipeline.update(scans[i]))
+
 
 """Some possible Mistakes"""
 